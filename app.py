@@ -1,5 +1,4 @@
 import streamlit as st
-import requests
 import time
 from numpy import around
 if st.secrets["runtime"]["STATUS"] == "Production":
@@ -24,84 +23,65 @@ if st.secrets["runtime"]["STATUS"] == "Production":
         unsafe_allow_html=True,
     )
 
+if "diagnostics" in st.query_params:
+    # Operators only, and kept out of the sidebar: see cracks/diagnostics.py.
+    from cracks.diagnostics import show
+    show(st.query_params["diagnostics"])
+    st.stop()
+
 import json
 from datetime import datetime
 # from streamlit_lottie import st_lottie
 
-import pandas as pd
 import philoui
 import streamlit.components.v1 as components
-import streamlit_shadcn_ui as ui
-import yaml
-from philoui.authentication_v2 import AuthenticateWithKey
-from philoui.io import QuestionnaireDatabase as IODatabase
-from philoui.io import conn, create_dichotomy, create_equaliser, create_qualitative, create_quantitative
 from philoui.survey import CustomStreamlitSurvey
 from philoui.texts import hash_text, stream_text, stream_once_then_write
 from streamlit_extras.add_vertical_space import add_vertical_space
 from streamlit_extras.row import row
-from streamlit_timeline import timeline
-from yaml import SafeLoader
-from streamlit_player import st_player
-from streamlit_gtag import st_gtag
-import gettext
-import locale
-
+from cracks.analytics import send_tracked, track
+from cracks.assets import inject_css
+from cracks.config import form_fields, get_authenticator, load_yaml
+from cracks.exporter import start_exporter
+from cracks.intro import IntroSequence
+from cracks.intro import play as play_intro
+from cracks.lazy import lazy_import
+from cracks.metrics import FORM_SUBMIT_ERRORS, record_rerun, span, timed
+from cracks.render_cache import fingerprint, globe_cache
+from cracks.sessions import logout, remember_session, restore_session
+from cracks.streaming import FRAME_BUDGET, frames
+from cracks.static import globe_scripts, manifest, texture_url
+from cracks.writebehind import get_write_queue, remember_ticket, submission_status
 from philoui.texts import stream_text
 
+# Not needed to draw the first screen: imported on first use.
+ui = lazy_import("streamlit_shadcn_ui")
+
+
+record_rerun("app")
+start_exporter()
 
-st_gtag(
-    key="gtag_app_splash",
-    id="G-Q55XHE2GJB",
-    event_name="splash_main_page",
-    params={
+track(
+    "splash_main_page",
+    {
         "event_category": "apply_splash",
         "event_label": "test_splash",
         "value": 99,
     },
 )
+send_tracked()
 
-config = {
-  "credentials": {
-    "webapp": "cracks-players",
-    "usernames": {
-    }
-  },
-  "cookie": {
-    "expiry_days": 30,
-    "expiry_minutes": 30,
-    "key": "cracks_panel_cookie",
-    "name": "cracks_panel_cookie"
-  },
-  "preauthorized": {
-    "emails": ""
-  }
-}
-
-
-authenticator = AuthenticateWithKey(
-    credentials=config['credentials'],
-    cookie_name=config['cookie']['name'],
-    cookie_key=config['cookie']['key'],
-    cookie_expiry_days=config['cookie']['expiry_days'],
-    pre_authorized=config['preauthorized'],
-)
-fields_connect = {'Form name':'Open with your access key', 'Email':'Email', 'Username':'Username',
-            'Password':'Password', 'Repeat password':'Repeat password',
-            'Register':' Retrieve access key ', 'Captcha':'Captcha'}
-fields_forge = {'Form name':'Where is my access key?', 'Email':'Email', 'Username':'Username',
-            'Password':'Password', 'Repeat password':'Repeat password',
-            'Register':' Here • Now ', 'Captcha':'Captcha'}
-
-db = IODatabase(conn, "discourse-data")
-
-with open("assets/cracks.css", "r") as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-    st.write(f.read())
-    
-with open('assets/credentials.yml') as file:
-    config = yaml.load(file, Loader=SafeLoader)
-    now = datetime.now()
+authenticator = get_authenticator("app")
+restore_session()
+# Signed in on another page (`authentifier` is not shown here): keep it.
+remember_session()
+fields_connect = form_fields("app", "connect")
+fields_forge = form_fields("app", "forge")
+
+inject_css()
+
+config = load_yaml()
+now = datetime.now()
 
 survey = CustomStreamlitSurvey()
 
@@ -129,31 +109,24 @@ def _form_submit():
         if not serialised_data:
             st.error("No data available. Please ensure data is correctly entered before proceeding.")
         else:
-            preferences_exists = db.check_existence(signature)
-            st.write(f"Integrating preferences `{mask_string(signature)}`")
-            _response = "Yes!" if preferences_exists else "Not yet"
-            st.info(f"Some of your preferences exist...{_response}")
-
             try:
-                data = {
-                    'signature': signature,
-                    'remote_05': json.dumps(serialised_data)
-                }
                 # throw an error if signature is null
                 if not signature:
                     raise ValueError("Signature cannot be null or empty.")
-                
-                query = conn.table('cracks-data')                \
-                       .upsert(data, on_conflict=['signature'])     \
-                       .execute()
-                
-                if query:
-                    st.success("🎊 Preferences integrated successfully!")
-                    st.balloons()
+                st.write(f"Integrating preferences `{mask_string(signature)}`")
+
+                # Queued: written in bulk with other sessions' submissions;
+                # the page shows the outcome (`submission_status`).
+                ticket = get_write_queue().submit('cracks-data', 'remote_05', signature,
+                                                  serialised_data, merge=False)
+                remember_ticket(ticket)
+                st.success("📬 Received! Your preferences are being saved.")
 
             except ValueError as ve:
+                FORM_SUBMIT_ERRORS.inc(page="app", kind="data")
                 st.error(f"Data error: {ve}")                
             except Exception as e:
+                FORM_SUBMIT_ERRORS.inc(page="app", kind="write")
                 st.error("🫥 Sorry! Failed to update data.")
                 st.write(e)
 
@@ -165,35 +138,14 @@ mask_string = lambda s: f"{s[0:4]}***{s[-4:]}"
 
 
 def stream_function(text):
-    import string
-    
-    # Define sleep lengths for different punctuation symbols
-    sleep_lengths = {'.': 2.2, ',': 0.3, '!': 1.7, '?': 2.5, ';': 1.4, ':': .8}
-    
-    for i, word in enumerate(text.split()):
-        # Check if the last character is a punctuation symbol
-        last_char = word[-1] if word[-1] in string.punctuation else None
-
-        # Yield the word or handle the line break
-        if word == '|':
-            yield " \n \n "  # Insert a line break (two new lines for readability)
-        
-        # Yield the word with appropriate sleep length
-        if last_char == '.' or last_char == '?':
-            yield word + " \n "
-        else:
-            yield word + " "
-        
-        # if word == '|':  # No sleep for line breaks
-            # continue
-                    
-        if last_char and last_char in sleep_lengths:
-            time.sleep(sleep_lengths[last_char])
-        else:
-            time.sleep(0.3)
+    # Words are coalesced into frames of about a second, so each reader
+    # sends a few deltas per sentence instead of one per word; the longer
+    # pauses after punctuation are kept.
+    yield from frames(text, budget=FRAME_BUDGET)
 
 
 
+@timed("app.my_create_dichotomy")
 def my_create_dichotomy(key, id = None, kwargs = {}):
     dico_style = """<style>
     div[data-testid='stVerticalBlock']:has(div#dicho_inner):not(:has(div#dicho_outer)) {background-color: #F5F5DC};
@@ -293,6 +245,7 @@ Here is a snapshot of current activities and developments. Any insight to share?
         `Click "Submit" to save your dashboard.`
         """)
     
+@timed("app.intro")
 def intro():
     cols = st.columns(4, vertical_alignment="center")
     today = datetime.now()
@@ -360,18 +313,13 @@ def authentifier():
         else:
             st.info('It seems that I am already connected')
                 # with col2:
-            authenticator.logout()
+            logout(authenticator)
+    remember_session()
 
-def next_step():
-
-    location = survey.text_input("Where are you connecting from?", id="location")
+def random_cities():
+    import random
 
-    cities = [
-    {"name": "New York", "lat": 40.7128, "lng": -74.0060, "size": random.random()},
-    {"name": "London", "lat": 51.5099, "lng": -0.1180, "size": random.random()},
-    {"name": "Paris", "lat": 48.8566, "lng": 2.3522, "size": random.random()},
-]    
-    cities = [
+    return [
     {"name": "New York", "lat": 40.7128, "lng": -74.0060,
         "maxR": random.random()*20+3,
         "propagationSpeed": (random.random()-.5)*20+1,
@@ -391,28 +339,12 @@ def next_step():
         "propagationSpeed": (random.random()-.5)*20+1,
         "repeatPeriod": random.random() * 2000 + 200, "size": random.random()},
 ]
-    # Generate JavaScript code with city data
-    javascript_code = f"""
-    // Gen city data
-    const cityData = { cities };
-    const N = 10;
-
-    console.log(cityData);
-
-    const map = Globe()
-    (document.getElementById('globeViz'))
-    .globeImageUrl('//unpkg.com/three-globe/example/img/earth-night.jpg')
-    .pointsData(cityData)
-    .backgroundColor('rgb(255, 255, 255)')
-    .pointAltitude('size')
-
-    // Add auto-rotation
-    map.controls().autoRotate = true;
-    map.controls().autoRotateSpeed = 1.6;
-    """
 
+@timed("app.render_city_globe")
+def render_city_globe(cities):
+    # Generate JavaScript code with city data
     javascript_code = f"""
-    import * as THREE from '//unpkg.com/three/build/three.module.js';
+    const THREE = window.THREE;
     const VELOCITY = 2; // minutes per frame
 
     const sunPosAt = dt => {{
@@ -428,14 +360,12 @@ def next_step():
 
 
     // Gen city data
-    const cityData = { cities };
+    const cityData = { json.dumps(cities) };
     const N = 10;
 
-    console.log(cityData);
-
     const map = Globe()
     (document.getElementById('globeViz'))
-    .globeImageUrl('//unpkg.com/three-globe/example/img/earth-night.jpg')
+    .globeImageUrl('{texture_url("earth-night.jpg")}')
     .ringsData(cityData)
     .ringMaxRadius('maxR')
     .ringPropagationSpeed('propagationSpeed')
@@ -470,9 +400,7 @@ def next_step():
     html_code = f"""
     <head>
     <style> body {{ margin: 0em; }} </style>
-    <script src="//unpkg.com/globe.gl"></script>
-    <script src="//unpkg.com/three"></script>
-    <script src="//unpkg.com/solar-calculator"></script>
+    {globe_scripts()}
     </head>
 
     <body>
@@ -484,6 +412,20 @@ def next_step():
     </script>
     </body>
     """
+    return html_code
+
+@timed("app.next_step")
+def next_step():
+
+    location = survey.text_input("Where are you connecting from?", id="location")
+
+    # Draw the ring parameters once per session so the globe is cacheable.
+    if 'globe_cities' not in st.session_state:
+        st.session_state['globe_cities'] = random_cities()
+    cities = st.session_state['globe_cities']
+
+    html_code = globe_cache.get_or_render(fingerprint("next_step", cities, manifest()),
+                                          lambda: render_city_globe(cities))
     col1, col2 = st.columns(2)
     with col1:
         st.components.v1.html(html_code, height=700, width=700)
@@ -512,17 +454,9 @@ if __name__ == "__main__":
     
     # intro()
     st.markdown("# <center>Cracks _on_ time?</center> ", unsafe_allow_html=True)
+    submission_status("app")
 
     if st.session_state['intro_done'] is False:
-        with st.spinner('Think about it...'):
-            time.sleep(5)
-
-        text = """"""
-        
-        # stream_once_then_write(text)
-
-        frame = st.empty()
-
         abstract = ["""
     # 
     We are working to build a dynamic platform that can serve as a resource for conservators and experimentalists, helping them input and analyse empirical data such as high-resolution images and environmental conditions. 
@@ -547,30 +481,14 @@ if __name__ == "__main__":
         ]
 
         _sleep= 5
-        with frame:
-            stream_once_then_write(abstract[0], stream_function=stream_function)
-        with st.spinner('Thinking about it...'):
-            time.sleep(_sleep)
-
-        
-        frame.empty()
-
-        with frame:
-            stream_once_then_write(abstract[1], stream_function=stream_function)
-            # st.markdown(abstract[1])
-        with st.spinner('Think about it...'):
-            time.sleep(_sleep)
-
-        frame.empty()
-
-        with frame:
-            stream_once_then_write(abstract[2], stream_function=stream_function)        
-        with st.spinner('Do you feel it?'):
-            time.sleep(_sleep)
-        
-        frame.empty()
-    
-        st.session_state['intro_done'] = True
+        # The browser plays the intro; the script thread returns at once.
+        sequence = IntroSequence(abstract,
+                                 captions=['Thinking about it...', 'Think about it...', 'Do you feel it?'],
+                                 lead=5, hold=_sleep, lead_caption='Think about it...')
+        with span("app.play_intro"):
+            intro_done = play_intro(sequence)
+        if not intro_done:
+            st.stop()
     
     
     from philoui.texts import corrupt_string
@@ -603,7 +521,9 @@ if __name__ == "__main__":
     
     """
     
-    st.write_stream(stream_function(text))
+    # Written at once: streaming it would hold the script thread for the
+    # length of the text on every rerun.
+    st.markdown(text)
     
     
 #     authentifier()
@@ -0,0 +1,330 @@
+"""Headless load test for `app.py` and `pages/ice.py`.
+
+    python benchmarks/loadtest.py --scenario all --sessions 20 --concurrency 4
+
+Each session drives a script through Streamlit's `AppTest`, without a
+server or browser, and times every rerun:
+
+- `first-visit`: the first run of `app.py`, i.e. the intro;
+- `app`: the intro, the run after it, a question typed and submitted;
+- `ice`: the ice page as a new visitor: an access key forged with the
+  registration form (" Here • Now ", no captcha), a login with that key
+  through the login form, then the six `survey.pages` and submit.  A
+  session whose forms do not sign it in counts as an error.
+
+The survey writes go to the local SQLite backend (`CRACKS_BACKEND=local`,
+see `cracks.connection`), with `--db-latency` seconds injected per round
+trip.  The key forms are philoui's `AuthenticateWithKey`, unchanged, and
+use its own storage.  philoui must be installed.
+
+Sessions are spread over `--concurrency` worker processes, each running
+`--threads` sessions at once in threads, as a server does.  AppTest
+installs its mock runtime as the process-wide `Runtime` singleton and
+clears it after each run; the workers let their threads share one instead.
+
+The report gives p50/p95/p99 rerun latency per scenario, database round
+trips per session, reruns per second and, with `--threads 1`, the peak
+memory traced during each session (tracemalloc cannot tell concurrent
+sessions apart, so it is left out otherwise).  With `--max-p95-ms` or
+`--max-errors` the exit status is 1 when a scenario goes over either
+budget.  `--output` appends the reports, with the versions and arguments
+of the run, to a JSON lines file to commit next to the change it measures.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SECRETS = {
+    "runtime": {"STATUS": "Development"},
+    "sumup": {"CLIENT_API_SECRET": "loadtest"},
+}
+# Buttons of the forms on the ice page (`cracks.config.FIELDS`).
+FORGE_BUTTON = "Here • Now"
+LOGIN_BUTTONS = ("Login", "Connect", "Retrieve access key")
+ACCESS_KEY = re.compile(r"access key is `([^`]+)`")
+
+
+def _share_runtime():
+    """Let the threads of a worker share one AppTest mock runtime."""
+    from streamlit.runtime import Runtime
+
+    last = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last["runtime"] = cls._instance
+        return last["runtime"]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: True)
+
+
+class Session:
+    """One simulated visitor: an AppTest plus the timings of its reruns."""
+
+    def __init__(self, script, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(str(ROOT / script), default_timeout=timeout)
+        for section, values in SECRETS.items():
+            self.at.secrets[section] = values
+        self.latencies = []
+
+    def run(self):
+        start = time.perf_counter()
+        self.at.run()
+        self.latencies.append(time.perf_counter() - start)
+        if self.at.exception:
+            raise RuntimeError(self.at.exception[0].message)
+
+    def fill(self, label, value):
+        for widget in self.at.text_input:
+            if widget.label == label:
+                widget.input(value)
+                return True
+        return False
+
+    def click(self, label=None, key=None):
+        for button in list(self.at.button):
+            if (key is not None and button.key == key) or (
+                label is not None and button.label.strip() == label
+            ):
+                button.click()
+                self.run()
+                return True
+        return False
+
+
+def first_visit(session):
+    session.run()
+
+
+def app_path(session):
+    session.run()
+    # What the intro fragment does once the animation is over.
+    session.at.session_state["intro_done"] = True
+    session.run()
+    session.fill("Share a Question:", "How do cracks remember time?")
+    session.click(key="submit_question")
+
+
+def sign_in(session):
+    """Forge an access key with the registration form, then log in with it."""
+    if not session.click(label=FORGE_BUTTON):
+        raise RuntimeError("the registration form is not shown")
+    keys = [
+        match.group(1)
+        for element in session.at.markdown
+        for match in [ACCESS_KEY.search(element.value)]
+        if match
+    ]
+    if not keys:
+        raise RuntimeError("the registration form gave no access key")
+    # The login form's fields are the only empty text inputs at this point.
+    for widget in session.at.text_input:
+        if not widget.value:
+            widget.input(keys[0])
+    if not any(session.click(label=label) for label in LOGIN_BUTTONS):
+        raise RuntimeError("the login form is not shown")
+    if not session.at.session_state["authentication_status"]:
+        raise RuntimeError("the login form did not sign in with the forged key")
+
+
+def ice_path(session):
+    session.run()
+    sign_in(session)
+    for page in range(6):
+        if page == 1:
+            session.fill("My  point is...", "The memory of ice.")
+        if page == 4:
+            session.fill("`Nice to meet you, what is your name?`", "Loadtest")
+        if not session.click(label="Next"):
+            break
+    session.click(label="Submit")
+
+
+SCENARIOS = {
+    "first-visit": ("app.py", first_visit),
+    "app": ("app.py", app_path),
+    "ice": ("pages/ice.py", ice_path),
+}
+
+
+def run_sessions(scenario, sessions, threads, timeout, db_latency):
+    """Worker: run `sessions` visits of `scenario`, `threads` at a time."""
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+    os.environ["CRACKS_BACKEND"] = "local"
+    os.environ["CRACKS_DB_LATENCY"] = str(db_latency)
+    from cracks.connection import local_client
+
+    _share_runtime()
+    client = local_client()
+    client.reset_stats()
+    script, drive = SCENARIOS[scenario]
+
+    # One session at a time: what tracemalloc sees is that session's.
+    traced = threads == 1
+
+    def visit(_):
+        if traced:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+        session = Session(script, timeout)
+        error = None
+        try:
+            drive(session)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        peak = tracemalloc.get_traced_memory()[1] - before if traced else None
+        return {"latencies": session.latencies, "error": error, "peak_bytes": peak}
+
+    if traced:
+        tracemalloc.start()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        visits = list(pool.map(visit, range(sessions)))
+    if traced:
+        tracemalloc.stop()
+    return {"visits": visits, "round_trips": client.stats()["round_trips"]}
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarise(scenario, workers, wall):
+    visits = [visit for worker in workers for visit in worker["visits"]]
+    latencies = [t for visit in visits for t in visit["latencies"]]
+    peaks = [visit["peak_bytes"] for visit in visits if visit["peak_bytes"] is not None]
+    round_trips = sum(worker["round_trips"] for worker in workers)
+    errors = [visit["error"] for visit in visits if visit["error"]]
+    return {
+        "scenario": scenario,
+        "sessions": len(visits),
+        "reruns": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1e3,
+        "p95_ms": percentile(latencies, 95) * 1e3,
+        "p99_ms": percentile(latencies, 99) * 1e3,
+        "max_ms": max(latencies, default=float("nan")) * 1e3,
+        "peak_mb_per_session": (
+            sum(peaks) / len(peaks) / 2**20 if peaks else float("nan")
+        ),
+        "round_trips_per_session": round_trips / len(visits) if visits else 0.0,
+        "reruns_per_s": len(latencies) / wall if wall else 0.0,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+    }
+
+
+def run_scenario(scenario, sessions, concurrency, threads, timeout, db_latency):
+    shares = [
+        sessions // concurrency + (i < sessions % concurrency)
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(run_sessions, scenario, share, threads, timeout, db_latency)
+            for share in shares
+            if share
+        ]
+        workers = [future.result() for future in futures]
+    return summarise(scenario, workers, time.perf_counter() - start)
+
+
+def over_budget(report, max_p95_ms=None, max_errors=None):
+    """Why `report` goes over the budgets, one line each; empty if it does not."""
+    reasons = []
+    if max_p95_ms is not None and not report["p95_ms"] <= max_p95_ms:
+        reasons.append(f"p95 {report['p95_ms']:.0f}ms > {max_p95_ms:.0f}ms")
+    if max_errors is not None and report["errors"] > max_errors:
+        reasons.append(f"{report['errors']} errors > {max_errors}")
+    return reasons
+
+
+def record_run(path, report, args):
+    """Append `report` to `path`, with what is needed to compare it later."""
+    import streamlit
+
+    record = {
+        "at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "streamlit": streamlit.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "args": {key: str(value) for key, value in vars(args).items()},
+        **report,
+    }
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenario", choices=[*SCENARIOS, "all"], default="all", help="path to drive"
+    )
+    parser.add_argument("--sessions", type=int, default=10, help="visits per scenario")
+    parser.add_argument("--concurrency", type=int, default=2, help="worker processes")
+    parser.add_argument("--threads", type=int, default=4, help="sessions per worker")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds per rerun")
+    parser.add_argument(
+        "--db-latency", type=float, default=0.05, help="seconds per round trip"
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON lines")
+    parser.add_argument("--max-p95-ms", type=float, help="p95 rerun budget")
+    parser.add_argument("--max-errors", type=int, help="failed sessions budget")
+    parser.add_argument("--output", type=Path, help="append the reports (JSON lines)")
+    args = parser.parse_args()
+
+    scenarios = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    if not args.json:
+        print(
+            f"{'scenario':>12} {'sessions':>8} {'reruns':>6} {'p50':>8} {'p95':>8} "
+            f"{'p99':>8} {'MB/sess':>8} {'rt/sess':>8} {'rerun/s':>8} {'errors':>6}"
+        )
+    status = 0
+    for scenario in scenarios:
+        report = run_scenario(
+            scenario,
+            args.sessions,
+            args.concurrency,
+            args.threads,
+            args.timeout,
+            args.db_latency,
+        )
+        if args.output is not None:
+            record_run(args.output, report, args)
+        for reason in over_budget(report, args.max_p95_ms, args.max_errors):
+            print(f"over budget: {scenario}: {reason}", file=sys.stderr)
+            status = 1
+        if args.json:
+            print(json.dumps(report))
+            continue
+        print(
+            f"{scenario:>12} {report['sessions']:>8} {report['reruns']:>6} "
+            f"{report['p50_ms']:>6.0f}ms {report['p95_ms']:>6.0f}ms "
+            f"{report['p99_ms']:>6.0f}ms {report['peak_mb_per_session']:>8.1f} "
+            f"{report['round_trips_per_session']:>8.1f} "
+            f"{report['reruns_per_s']:>8.1f} {report['errors']:>6}"
+        )
+        if report["first_error"]:
+            print(f"{'':>12} first error: {report['first_error']}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Compare the JSON and Float32 transports for globe point sets.
+
+    python benchmarks/transport.py [--sizes 10000 100000 1000000]
+
+For each size, reports the payload embedded in the iframe and the time to
+build it, for three paths:
+
+- `records`: the original list of `{name, lat, lng, energy}` objects,
+- `columns`: the same data as JSON columns,
+- `float32`: base64 Float32 buffers (`cracks.transport.pack_columns`).
+
+Decoding is measured in Python (`json.loads` vs `base64` + `frombuffer`) as
+a stand-in for the browser, which pays a per-value parse for JSON and a
+single copy for typed arrays.
+
+Measured on one core (Python 3.11, numpy 1.26):
+
+     points  path       payload     encode     decode
+      10000  records     1.01MB     61.3ms     24.3ms
+      10000  columns     0.56MB     17.3ms      9.2ms
+      10000  float32     0.15MB      0.6ms      0.8ms
+     100000  records    10.19MB    447.8ms    242.9ms
+     100000  columns     5.62MB    219.9ms     92.7ms
+     100000  float32     1.53MB      8.2ms      8.6ms
+    1000000  records   102.85MB   5191.2ms   2414.7ms
+    1000000  columns    56.23MB   2858.7ms   1540.2ms
+    1000000  float32    15.26MB    117.2ms    104.7ms
+
+Float32 buffers are about 7x smaller than the records and 20-100x faster to
+build and decode.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cracks.transport import pack_columns, unpack_columns  # noqa: E402
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        "lat": np.degrees(np.arcsin(rng.uniform(-1, 1, n))),
+        "lng": rng.uniform(-180, 180, n),
+        "energy": rng.uniform(0, 100, n),
+    }
+
+
+def encoders(columns):
+    def records():
+        return json.dumps(
+            [
+                {"name": f"site {i}", "lat": lat, "lng": lng, "energy": energy}
+                for i, (lat, lng, energy) in enumerate(
+                    zip(
+                        columns["lat"].tolist(),
+                        columns["lng"].tolist(),
+                        columns["energy"].tolist(),
+                    )
+                )
+            ]
+        )
+
+    def plain_columns():
+        return json.dumps({name: values.tolist() for name, values in columns.items()})
+
+    def float32():
+        return json.dumps(pack_columns(columns))
+
+    return {"records": records, "columns": plain_columns, "float32": float32}
+
+
+def decoders():
+    return {
+        "records": json.loads,
+        "columns": json.loads,
+        "float32": lambda payload: unpack_columns(json.loads(payload)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'points':>9} {'path':>8} {'payload':>10} {'encode':>9} {'decode':>9}"
+    )
+    for n in args.sizes:
+        columns = points(n)
+        decode = decoders()
+        for path, encode in encoders(columns).items():
+            payload, encode_s = timed(encode, args.repeat)
+            _, decode_s = timed(lambda: decode[path](payload), args.repeat)
+            print(
+                f"{n:>9} {path:>8} {len(payload) / 2**20:>8.2f}MB "
+                f"{encode_s * 1e3:>7.1f}ms {decode_s * 1e3:>7.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Support modules for the Cracks on Time pages."""
@@ -0,0 +1,221 @@
+"""Once-per-session analytics events, sent in batches.
+
+`track(name, params)` records an event at most once per session (per name
+and parameters) and never blocks the rerun.  Where the event goes is set by
+`CRACKS_ANALYTICS`, or `st.secrets["runtime"]["ANALYTICS"]`:
+
+- `gtag` (default): gtag.js in the page.  The session's events are listed
+  in one component that `send_tracked()` renders at the top of the sidebar
+  on every rerun.  Its content only changes with a new event, so the frame
+  stays mounted and gtag.js has time to load; events acknowledged by gtag
+  are remembered in the tab's `sessionStorage` and not sent again when the
+  frame is replaced;
+- `mp`: the GA4 Measurement Protocol, from a process-wide buffer flushed
+  by a background thread in requests of up to `MAX_BATCH` events.  Needs
+  `runtime.GA_API_SECRET`;
+- `file`: the same buffer, appended as JSON lines to `CRACKS_ANALYTICS_FILE`
+  (default `CACHE_DIR/analytics.jsonl`), for offline testing;
+- `off`: nothing is recorded.
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+
+import streamlit as st
+
+from cracks.background import BackgroundFlusher
+from cracks.config import CACHE_DIR, setting
+
+logger = logging.getLogger(__name__)
+
+MEASUREMENT_ID = "G-Q55XHE2GJB"
+MP_URL = "https://www.google-analytics.com/mp/collect"
+# Events per Measurement Protocol request, the protocol's maximum.
+MAX_BATCH = 25
+FLUSH_INTERVAL = 5.0
+MAX_BUFFER = 10000
+ANALYTICS_FILE = CACHE_DIR / "analytics.jsonl"
+# `sessionStorage` key of the gtag events already sent from the tab.
+SENT_KEY = "cracks_gtag_sent"
+
+
+class FileSink:
+    def __init__(self, path=ANALYTICS_FILE):
+        self.path = Path(path)
+
+    def send(self, events):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            for event in events:
+                f.write(json.dumps(event) + "\n")
+
+
+class MeasurementProtocolSink:
+    def __init__(self, measurement_id, api_secret, timeout=5.0):
+        import httpx
+
+        self.params = {"measurement_id": measurement_id, "api_secret": api_secret}
+        self.client = httpx.Client(timeout=timeout)
+
+    def send(self, events):
+        by_client = {}
+        for event in events:
+            by_client.setdefault(event["client_id"], []).append(
+                {
+                    "name": event["name"],
+                    "params": event["params"],
+                    "timestamp_micros": event["timestamp_micros"],
+                }
+            )
+        for client_id, batch in by_client.items():
+            for start in range(0, len(batch), MAX_BATCH):
+                events = batch[start : start + MAX_BATCH]
+                response = self.client.post(
+                    MP_URL,
+                    params=self.params,
+                    json={"client_id": client_id, "events": events},
+                )
+                response.raise_for_status()
+
+
+class AnalyticsBuffer(BackgroundFlusher):
+    """Events waiting for a server-side sink, flushed in the background."""
+
+    def __init__(self, sink, max_batch=MAX_BATCH, flush_interval=FLUSH_INTERVAL):
+        super().__init__(flush_interval, name="analytics")
+        self.sink = sink
+        self.max_batch = max_batch
+        self._events = []
+        self._counters = {"recorded": 0, "sent": 0, "dropped": 0, "failed_batches": 0}
+        self._start()
+
+    def record(self, event):
+        with self._condition:
+            self._counters["recorded"] += 1
+            if len(self._events) >= MAX_BUFFER:
+                self._events.pop(0)
+                self._counters["dropped"] += 1
+            self._events.append(event)
+            if self._full():
+                self._condition.notify()
+
+    def flush(self):
+        with self._condition:
+            events, self._events = self._events, []
+        if not events:
+            return
+        try:
+            self.sink.send(events)
+        except Exception:
+            logger.exception("analytics: %d events not sent", len(events))
+            with self._condition:
+                self._counters["failed_batches"] += 1
+                self._counters["dropped"] += len(events)
+        else:
+            with self._condition:
+                self._counters["sent"] += len(events)
+
+    def stats(self):
+        with self._condition:
+            return {**self._counters, "pending": len(self._events)}
+
+    def _full(self):
+        return len(self._events) >= self.max_batch
+
+
+def mode():
+    return setting("ANALYTICS", "gtag")
+
+
+@st.cache_resource
+def get_analytics_buffer(mode_name):
+    """The process-wide buffer for the `mp` and `file` modes."""
+    if mode_name == "file":
+        sink = FileSink(os.environ.get("CRACKS_ANALYTICS_FILE", ANALYTICS_FILE))
+    else:
+        sink = MeasurementProtocolSink(
+            MEASUREMENT_ID, st.secrets["runtime"]["GA_API_SECRET"]
+        )
+    return AnalyticsBuffer(sink)
+
+
+def analytics_stats():
+    """Counters of the buffer, when a buffered mode is in use."""
+    mode_name = mode()
+    if mode_name not in ("mp", "file"):
+        return None
+    return get_analytics_buffer(mode_name).stats()
+
+
+def track(name, params=None):
+    """Record event `name` once for this session; False if already sent."""
+    mode_name = mode()
+    if mode_name == "off":
+        return False
+    params = params or {}
+    sent = st.session_state.setdefault("analytics_sent", set())
+    dedupe = (name, json.dumps(params, sort_keys=True, default=str))
+    if dedupe in sent:
+        return False
+    sent.add(dedupe)
+
+    if mode_name == "gtag":
+        st.session_state.setdefault("analytics_events", []).append(
+            {"id": uuid.uuid4().hex, "name": name, "params": params}
+        )
+        return True
+
+    client_id = st.session_state.setdefault("analytics_client_id", str(uuid.uuid4()))
+    get_analytics_buffer(mode_name).record(
+        {
+            "client_id": client_id,
+            "name": name,
+            "params": params,
+            "timestamp_micros": int(time.time() * 1e6),
+        }
+    )
+    return True
+
+
+def gtag_html(events):
+    """Page loading gtag.js and sending those of `events` not sent yet."""
+    data = json.dumps(events, default=str).replace("</", "<\\/")
+    return f"""
+<script async src="https://www.googletagmanager.com/gtag/js?id={MEASUREMENT_ID}"></script>
+<script>
+window.dataLayer = window.dataLayer || [];
+function gtag(){{dataLayer.push(arguments);}}
+gtag('js', new Date());
+gtag('config', '{MEASUREMENT_ID}');
+const store = window.parent.sessionStorage;
+const sent = new Set(JSON.parse(store.getItem("{SENT_KEY}") || "[]"));
+for (const event of {data}) {{
+    if (sent.has(event.id)) continue;
+    gtag('event', event.name, Object.assign({{}}, event.params, {{
+        event_callback: () => {{
+            sent.add(event.id);
+            store.setItem("{SENT_KEY}", JSON.stringify([...sent]));
+        }},
+    }}));
+}}
+</script>
+"""
+
+
+def send_tracked():
+    """Render the gtag tracker of this session in the sidebar.
+
+    Call it on every rerun, before anything else goes into the sidebar, so
+    the tracker keeps its place and is not remounted.
+    """
+    events = st.session_state.get("analytics_events")
+    if not events:
+        return
+    import streamlit.components.v1 as components
+
+    with st.sidebar:
+        components.html(gtag_html(events), height=0)
@@ -0,0 +1,123 @@
+"""Stylesheets from `assets/`, bundled once per process.
+
+`css_bundle(*names)` reads, minifies and concatenates the named files.  The
+result is kept until one of the files changes: a new mtime or size triggers
+a re-read, and the bundle is rebuilt only if the content hash differs.
+`@import` rules are hoisted to the top, where CSS requires them.
+
+`inject_css` adds the bundle to the page once per session.  The style element
+is written into the parent document by a zero-height component, so it stays
+in place across reruns and page switches without being re-sent each time;
+it is only re-sent when the bundle changes.  `effects.css` (the animated
+background) is not part of `STYLES`: it restyles every element, so pages
+that want it ask for it explicitly.
+"""
+
+import hashlib
+import json
+import re
+import threading
+from pathlib import Path
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+ASSETS_DIR = Path(__file__).resolve().parent.parent / "assets"
+STYLES = ("cracks.css",)
+EFFECTS = "effects.css"
+
+_TOKENS = re.compile(
+    r"""(?P<string>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')"""
+    r"|(?P<comment>/\*.*?\*/)"
+    r"|(?P<space>\s+)"
+    r"|(?P<other>[^\s\"'/]+|/)",
+    re.S,
+)
+_IMPORT = re.compile(
+    r"""@import\s*(?:url\((?:"[^"]*"|'[^']*'|[^)]*)\)|"[^"]*"|'[^']*')[^;]*;"""
+)
+# No space is needed on either side of these.
+_TIGHT = set("{};,>")
+
+_bundles = {}
+_lock = threading.Lock()
+
+
+def minify_css(text):
+    """`text` without comments and redundant whitespace; strings are kept."""
+    out = []
+    pending_space = False
+    for match in _TOKENS.finditer(text):
+        kind, token = match.lastgroup, match.group()
+        if kind == "comment":
+            continue
+        if kind == "space":
+            pending_space = True
+            continue
+        if pending_space and out and out[-1][-1] not in _TIGHT | {":"}:
+            if token[0] not in _TIGHT:
+                out.append(" ")
+        pending_space = False
+        out.append(token)
+    return "".join(out).replace(";}", "}")
+
+
+def _stamps(names):
+    stamps = []
+    for name in names:
+        stat = (ASSETS_DIR / name).stat()
+        stamps.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(stamps)
+
+
+def _build(names):
+    imports, rules = [], []
+    for name in names:
+        css = minify_css((ASSETS_DIR / name).read_text())
+        imports.extend(_IMPORT.findall(css))
+        rules.append(_IMPORT.sub("", css))
+    css = "".join(imports + rules)
+    return css, hashlib.blake2b(css.encode(), digest_size=8).hexdigest()
+
+
+def css_bundle(*names):
+    """Minified CSS of `names` (default `STYLES`) and its content hash."""
+    names = names or STYLES
+    with _lock:
+        stamps = _stamps(names)
+        cached = _bundles.get(names)
+        if cached is not None and cached[0] == stamps:
+            return cached[1], cached[2]
+        css, digest = _build(names)
+        if cached is not None and cached[2] == digest:
+            css = cached[1]
+        _bundles[names] = (stamps, css, digest)
+        return css, digest
+
+
+def inject_css(*names, key="cracks-css"):
+    """Add the bundle of `names` to the page, once per session and bundle."""
+    css, digest = css_bundle(*names)
+    injected = st.session_state.setdefault("injected_css", {})
+    if injected.get(key) == digest:
+        return False
+    # `</script>` in the stylesheet must not close the script tag.
+    text = json.dumps(css).replace("</", "<\\/")
+    components.html(
+        f"""<script>
+const doc = window.parent.document;
+let style = doc.getElementById({json.dumps(key)});
+if (!style) {{
+    style = doc.createElement("style");
+    style.id = {json.dumps(key)};
+    doc.head.appendChild(style);
+}}
+if (style.dataset.digest !== {json.dumps(digest)}) {{
+    style.textContent = {text};
+    style.dataset.digest = {json.dumps(digest)};
+}}
+</script>""",
+        height=0,
+    )
+    injected[key] = digest
+    return True
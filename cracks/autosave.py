@@ -0,0 +1,57 @@
+"""Incremental autosave of survey answers.
+
+When a user moves between `survey.pages`, the survey data is compared with
+the last snapshot persisted for this session and only the keys that changed
+are queued, as a merge, on the write-behind queue.  Writes are debounced by
+the queue itself (`submit(..., delay=debounce)`): changes queued within
+`debounce` seconds of each other are coalesced into one write.  Nothing is
+held back in the session, so changes are stored even if the session ends
+right after; a final submit of the same document (no delay) is coalesced
+with them and flushes them at once.
+
+The session counts its autosaves in `_state()["version"]`; the count is
+not written into the user's document.
+"""
+
+import copy
+
+import streamlit as st
+
+from cracks.writebehind import get_write_queue
+
+DEBOUNCE = 2.0
+
+
+def _state():
+    if "autosave" not in st.session_state:
+        st.session_state["autosave"] = {"snapshot": {}, "version": 0, "page": None}
+    return st.session_state["autosave"]
+
+
+def changed_keys(data, snapshot):
+    """Keys of `data` whose value differs from `snapshot`."""
+    return {
+        key: value
+        for key, value in data.items()
+        if key not in snapshot or snapshot[key] != value
+    }
+
+
+def autosave(table, column, signature, data, page, debounce=DEBOUNCE):
+    """Queue the changes to `data` when `page` differs from the last rerun.
+
+    Returns the session's autosave count, or None when nothing was queued.
+    """
+    state = _state()
+    moved = state["page"] is not None and page != state["page"]
+    state["page"] = page
+    if not signature or not moved:
+        return None
+
+    patch = copy.deepcopy(changed_keys(data, state["snapshot"]))
+    if not patch:
+        return None
+    get_write_queue().submit(table, column, signature, patch, delay=debounce)
+    state["snapshot"].update(patch)
+    state["version"] += 1
+    return state["version"]
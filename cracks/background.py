@@ -0,0 +1,59 @@
+"""Base for process-wide buffers flushed by a background thread.
+
+A subclass keeps its pending items under `self._condition`, says when they
+fill a batch (`_full`) and writes them out (`flush`).  The thread flushes
+when a batch is full, or every `flush_interval` seconds; `record`-style
+methods call `self._condition.notify()` once `_full()` to flush early.
+`close` (also run at exit) stops the thread and flushes what is left.
+"""
+
+import atexit
+import threading
+import time
+
+
+class BackgroundFlusher:
+    def __init__(self, flush_interval, name):
+        self.flush_interval = flush_interval
+        self._name = name
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def _start(self):
+        """Start the flushing thread, once the subclass is set up."""
+        self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _full(self):
+        """Whether a batch is ready; called under `self._condition`."""
+        raise NotImplementedError
+
+    def flush(self):
+        raise NotImplementedError
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 2)
+        self.flush()
+
+    def _flush_in_background(self, full):
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and not self._full():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if self._closed:
+                    return
+                full = self._full()
+            self._flush_in_background(full)
@@ -0,0 +1,185 @@
+"""Columnar catalog of crack sites.
+
+Sites are held as NumPy columns (latitude, longitude, energy) and every
+string field is dictionary-encoded: an integer code column plus a small
+vocabulary.  Building the globe point list or the marquee is then a slice
+over arrays instead of a walk through nested dicts.
+"""
+
+import numpy as np
+
+# Dictionary-encoded string fields, in the order they are stored.
+STRING_FIELDS = ("category", "region", "type", "factors", "impact", "significance")
+
+# Separator used to flatten the list of contributing factors into one string.
+FACTORS_SEP = "; "
+
+
+def _encode(values):
+    """Dictionary-encode a sequence of strings into (codes, vocabulary)."""
+    vocab, codes = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+    return codes.astype(np.int32), vocab
+
+
+class CrackCatalog:
+    """Array-backed collection of crack sites."""
+
+    def __init__(self, lat, lon, energy, strings):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.energy = np.asarray(energy, dtype=np.float32)
+        # field -> (codes, vocabulary)
+        self.strings = strings
+        self._fingerprint = None
+
+    def __len__(self):
+        return len(self.lat)
+
+    def codes(self, field):
+        return self.strings[field][0]
+
+    def vocabulary(self, field):
+        return self.strings[field][1]
+
+    def decode(self, field, mask=None):
+        """Return the decoded string column, optionally restricted to `mask`."""
+        codes, vocab = self.strings[field]
+        if mask is not None:
+            codes = codes[mask]
+        return vocab[codes]
+
+    @property
+    def fingerprint(self):
+        """Content hash of the catalog, computed once."""
+        if self._fingerprint is None:
+            import hashlib
+
+            h = hashlib.blake2b(digest_size=16)
+            for column in (self.lat, self.lon, self.energy):
+                h.update(np.ascontiguousarray(column).tobytes())
+            for field in STRING_FIELDS:
+                codes, vocab = self.strings[field]
+                h.update(np.ascontiguousarray(codes).tobytes())
+                h.update("\x00".join(map(str, vocab)).encode())
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    @classmethod
+    def from_nested(cls, cryosphere_cracks):
+        """Build a catalog from the `{category: [entry, ...]}` literal."""
+        rows = [
+            (category, entry)
+            for category, entries in cryosphere_cracks.items()
+            for entry in entries
+        ]
+        lat = [entry["Latitude"] for _, entry in rows]
+        lon = [entry["Longitude"] for _, entry in rows]
+        energy = [entry["Elastic_Energy"] for _, entry in rows]
+        columns = {
+            "category": [category for category, _ in rows],
+            "region": [entry["Region"] for _, entry in rows],
+            "type": [entry["Characteristics"]["Type"] for _, entry in rows],
+            "factors": [
+                FACTORS_SEP.join(entry["Characteristics"]["Contributing Factors"])
+                for _, entry in rows
+            ],
+            "impact": [entry["Characteristics"]["Impact"] for _, entry in rows],
+            "significance": [
+                entry["Characteristics"]["Significance"] for _, entry in rows
+            ],
+        }
+        return cls(
+            np.array(lat, dtype=np.float64),
+            np.array([np.nan if x is None else x for x in lon], dtype=np.float64),
+            energy,
+            {field: _encode(columns[field]) for field in STRING_FIELDS},
+        )
+
+    @classmethod
+    def from_parquet(cls, path):
+        """Load a catalog from a Parquet file.
+
+        Expected columns: `lat`, `lon`, `energy` and the string fields in
+        `STRING_FIELDS`.  String columns are dictionary-encoded by Arrow.
+        """
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path, read_dictionary=list(STRING_FIELDS))
+        return cls.from_arrow(table)
+
+    @classmethod
+    def from_arrow(cls, table):
+        import pyarrow as pa
+
+        strings = {}
+        for field in STRING_FIELDS:
+            column = table.column(field)
+            if not pa.types.is_dictionary(column.type):
+                column = column.dictionary_encode()
+            column = column.unify_dictionaries().combine_chunks()
+            strings[field] = (
+                column.indices.to_numpy(zero_copy_only=False).astype(np.int32),
+                np.asarray(column.dictionary.to_pylist(), dtype=object),
+            )
+        return cls(
+            table.column("lat").to_numpy(),
+            table.column("lon").to_numpy(),
+            table.column("energy").to_numpy(),
+            strings,
+        )
+
+    def to_arrow(self):
+        import pyarrow as pa
+
+        columns = {"lat": self.lat, "lon": self.lon, "energy": self.energy}
+        for field in STRING_FIELDS:
+            codes, vocab = self.strings[field]
+            columns[field] = pa.DictionaryArray.from_arrays(
+                pa.array(codes), pa.array(list(vocab), type=pa.string())
+            )
+        return pa.table(columns)
+
+    def to_parquet(self, path):
+        import pyarrow.parquet as pq
+
+        pq.write_table(self.to_arrow(), path)
+
+    def located(self):
+        """Boolean mask of the sites with valid coordinates."""
+        return np.isfinite(self.lat) & np.isfinite(self.lon)
+
+    def points(self, mask=None, energy_scale=10):
+        """Columns for the globe: `name`, `lat`, `lng`, `energy`."""
+        if mask is None:
+            mask = self.located()
+        return {
+            "name": self.decode("region", mask),
+            "lat": self.lat[mask],
+            "lng": self.lon[mask],
+            "energy": self.energy[mask] * energy_scale,
+        }
+
+    def marquee_items(self, limit=None):
+        """Ticker lines, one per site, at most `limit` of them."""
+        index = np.flatnonzero(self.located())[:limit]
+        # Lowercase each vocabulary entry once rather than once per site.
+        factors = np.array(
+            [f.replace(FACTORS_SEP, " and ").lower() for f in self.vocabulary("factors")],
+            dtype=object,
+        )
+        impacts = np.array(
+            [i.lower() for i in self.vocabulary("impact")], dtype=object
+        )
+        regions = self.decode("region", index)
+        factors = factors[self.codes("factors")[index]]
+        impacts = impacts[self.codes("impact")[index]]
+        return [
+            f"{region} ({lat}, {lon}) [cracks by] {factor}, its impact: {impact}"
+            for region, lat, lon, factor, impact in zip(
+                regions,
+                self.lat[index].tolist(),
+                self.lon[index].tolist(),
+                factors,
+                impacts,
+            )
+        ]
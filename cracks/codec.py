@@ -0,0 +1,148 @@
+"""Encoding of stored survey payloads.
+
+A codec is named `<format>[+<compression>]`:
+
+- format `json` (default) or `msgpack`;
+- compression `deflate` (zlib) or `zstd` (needs the `zstandard` package).
+
+A codec whose packages are missing is rejected when it is built, so a bad
+`PAYLOAD_CODEC` setting fails at start-up rather than at the first write.
+
+Stored values describe themselves, so readers decode any of them with
+`decode`:
+
+- plain JSON text, as written so far, starts with `{`;
+- other formats are `<codec>:<base64>`, e.g. `msgpack+zstd:KLUv/...`;
+- inside JSON, a compressed long string is `{"$z": "<compression>", "b": "<base64>"}`.
+
+Documents merged server-side (`merge_json_field`) must stay JSON, so
+`encode_patch` only compresses long string values and leaves the structure
+alone; `encode` serialises a whole document and is used for replace writes.
+
+The app only writes documents (`cracks.writebehind`); nothing in it reads
+one back yet.  Whatever does (an export, a dashboard) must go through
+`decode`.  The base64 Float32 columns of `cracks.transport` are not stored
+payloads: they are sent to the globe iframe and decoded there.
+"""
+
+import base64
+import importlib
+import json
+import zlib
+
+from cracks.config import setting
+
+FORMATS = ("json", "msgpack")
+COMPRESSIONS = ("deflate", "zstd")
+# Strings shorter than this are not worth compressing.
+MIN_SIZE = 512
+TAG = "$z"
+
+
+def _compress(compression, data):
+    if compression == "deflate":
+        return zlib.compress(data, 6)
+    import zstandard
+
+    return zstandard.ZstdCompressor(level=10).compress(data)
+
+
+def _decompress(compression, data):
+    if compression == "deflate":
+        return zlib.decompress(data)
+    import zstandard
+
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def _require(module, codec):
+    try:
+        importlib.import_module(module)
+    except ImportError as e:
+        raise ImportError(f"Payload codec {codec!r} needs the `{module}` package.") from e
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+class PayloadCodec:
+    def __init__(self, name="json", min_size=MIN_SIZE):
+        format, _, compression = name.partition("+")
+        if format not in FORMATS:
+            raise ValueError(f"Unknown payload format: {format!r}")
+        if compression and compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown payload compression: {compression!r}")
+        if format == "msgpack":
+            _require("msgpack", name)
+        if compression == "zstd":
+            _require("zstandard", name)
+        self.name = name
+        self.format = format
+        self.compression = compression or None
+        self.min_size = min_size
+
+    def __repr__(self):
+        return f"PayloadCodec({self.name!r})"
+
+    def _pack_strings(self, value):
+        if isinstance(value, dict):
+            return {key: self._pack_strings(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._pack_strings(item) for item in value]
+        if isinstance(value, str) and len(value) >= self.min_size:
+            packed = _compress(self.compression, value.encode())
+            return {TAG: self.compression, "b": _b64(packed)}
+        return value
+
+    def encode_patch(self, document):
+        """JSON-compatible `document`, long strings compressed if enabled."""
+        if self.compression is None:
+            return document
+        return self._pack_strings(document)
+
+    def encode(self, document):
+        """Text to store for the whole `document`."""
+        if self.format == "json":
+            return json.dumps(self.encode_patch(document))
+        import msgpack
+
+        data = msgpack.packb(document, use_bin_type=True)
+        if self.compression is not None:
+            data = _compress(self.compression, data)
+        return f"{self.name}:{_b64(data)}"
+
+
+def _unpack_strings(value):
+    if isinstance(value, dict):
+        if TAG in value and set(value) == {TAG, "b"}:
+            return _decompress(value[TAG], base64.b64decode(value["b"])).decode()
+        return {key: _unpack_strings(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_unpack_strings(item) for item in value]
+    return value
+
+
+def decode(value):
+    """Document from a stored value written by any codec."""
+    if value is None or value == "":
+        return {}
+    if isinstance(value, (dict, list)):
+        return _unpack_strings(value)
+    if value.lstrip()[:1] in ("{", "["):
+        return _unpack_strings(json.loads(value))
+    name, _, data = value.partition(":")
+    codec = PayloadCodec(name)
+    data = base64.b64decode(data)
+    if codec.compression is not None:
+        data = _decompress(codec.compression, data)
+    if codec.format == "json":
+        return _unpack_strings(json.loads(data))
+    import msgpack
+
+    return msgpack.unpackb(data, raw=False)
+
+
+def get_codec():
+    """The codec named by the `PAYLOAD_CODEC` setting, or JSON."""
+    return PayloadCodec(setting("PAYLOAD_CODEC", "json"))
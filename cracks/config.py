@@ -0,0 +1,156 @@
+"""Configuration parsed once per process.
+
+`load_yaml(path)` parses a YAML file the first time it is asked for and
+again only after the file's mtime or size changes.  What it returns, like
+the authenticator settings in `AUTH` and the form labels in `FIELDS`, is
+frozen (mappings are read-only, lists become tuples), so one copy can be
+shared by every session without one of them changing it for the others.
+
+`setting(name, default)` reads a runtime setting: the `CRACKS_<name>`
+environment variable, else `st.secrets["runtime"][name]`, converted to the
+type of `default`; `secret(section, key)` reads any other secret.  Both
+return the default when the app runs without a secrets file.
+
+`get_authenticator(page)` builds an `AuthenticateWithKey` from a thawed copy
+of `AUTH[page]`.  The authenticator itself is not shared across sessions or
+reruns: it mounts its cookie component when constructed and `register_user`
+writes into its `credentials`, so a shared instance would neither render
+for the next rerun nor keep one user's registration from another's.
+"""
+
+import copy
+import os
+import threading
+from pathlib import Path
+from types import MappingProxyType
+
+ROOT = Path(__file__).resolve().parent.parent
+ASSETS_DIR = ROOT / "assets"
+# Files written at run time (caches, dead letters), whatever the cwd.
+CACHE_DIR = ROOT / ".cache"
+CREDENTIALS = ASSETS_DIR / "credentials.yml"
+
+_files = {}
+_lock = threading.Lock()
+
+
+def freeze(value):
+    """Read-only deep copy of `value`."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return copy.deepcopy(value)
+
+
+def secret(section, key, default=None):
+    """`st.secrets[section][key]`, or `default`."""
+    import streamlit as st
+
+    try:
+        return st.secrets[section].get(key, default)
+    except (KeyError, FileNotFoundError):
+        return default
+
+
+def setting(name, default=None):
+    """Runtime setting `name`, from the environment or the secrets."""
+    value = os.environ.get(f"CRACKS_{name}")
+    if value is None:
+        value = secret("runtime", name, default)
+    if value is None or default is None or isinstance(value, type(default)):
+        return value
+    if isinstance(default, bool):
+        return str(value).strip().lower() in ("1", "true", "yes", "on")
+    return type(default)(value)
+
+
+def thaw(value):
+    """Mutable deep copy of a frozen `value`."""
+    if isinstance(value, MappingProxyType):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return copy.deepcopy(value)
+
+
+def load_yaml(path=CREDENTIALS):
+    """Frozen contents of the YAML file at `path`."""
+    import yaml
+
+    path = Path(path).resolve()
+    with _lock:
+        stat = path.stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = _files.get(path)
+        if cached is None or cached[0] != stamp:
+            with open(path) as file:
+                cached = (stamp, freeze(yaml.load(file, Loader=yaml.SafeLoader)))
+            _files[path] = cached
+        return cached[1]
+
+
+def _auth(webapp, cookie, expiry_days):
+    return {
+        "credentials": {"webapp": webapp, "usernames": {}},
+        "cookie": {
+            "expiry_days": expiry_days,
+            "expiry_minutes": 30,
+            "key": cookie,
+            "name": cookie,
+        },
+        "preauthorized": {"emails": ""},
+    }
+
+
+def _fields(form_name, register):
+    return {
+        "Form name": form_name,
+        "Email": "Email",
+        "Username": "Username",
+        "Password": "Password",
+        "Repeat password": "Repeat password",
+        "Register": register,
+        "Captcha": "Captcha",
+    }
+
+
+AUTH = freeze(
+    {
+        "app": _auth("cracks-players", "cracks_panel_cookie", 30),
+        "ice": _auth("cracks-players", "ice_panel_cookie", 20),
+    }
+)
+
+FIELDS = freeze(
+    {
+        "app": {
+            "connect": _fields("Open with your access key", " Retrieve access key "),
+            "forge": _fields("Where is my access key?", " Here • Now "),
+        },
+        "ice": {
+            "connect": _fields("Open with your access key", " Retrieve access key "),
+            "forge": _fields("I agree to share my vantage point", " Here • Now "),
+            "forge2": _fields("Register access key", " Update keys database "),
+        },
+    }
+)
+
+
+def form_fields(page, form):
+    """Labels of `form` on `page`, as the dict the authenticator expects."""
+    return thaw(FIELDS[page][form])
+
+
+def get_authenticator(page):
+    """A fresh `AuthenticateWithKey` for `page`, from the cached settings."""
+    from philoui.authentication_v2 import AuthenticateWithKey
+
+    config = thaw(AUTH[page])
+    return AuthenticateWithKey(
+        credentials=config["credentials"],
+        cookie_name=config["cookie"]["name"],
+        cookie_key=config["cookie"]["key"],
+        cookie_expiry_days=config["cookie"]["expiry_days"],
+        pre_authorized=config["preauthorized"],
+    )
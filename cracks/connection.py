@@ -0,0 +1,178 @@
+"""Database client used by the pages.
+
+The backend is picked by the `CRACKS_BACKEND` environment variable, or
+`st.secrets["runtime"]["BACKEND"]`:
+
+- `supabase` (default): one pooled PostgREST client per process, built from
+  `st.secrets["connections"]["supabase"]` (`SUPABASE_URL`, `SUPABASE_KEY`).
+  Its keep-alive pool is sized by `DB_POOL_SIZE` and requests time out
+  after `DB_TIMEOUT` seconds (both under `runtime`, or as `CRACKS_*`
+  environment variables).  Without credentials the `conn` from
+  `philoui.io` is used as before;
+- `local`: a `cracks.localdb.LocalClient` on SQLite, one per process, with
+  `CRACKS_LOCAL_DB` (path, default in memory) and `CRACKS_DB_LATENCY` /
+  `CRACKS_DB_JITTER` (seconds injected per round trip).
+
+Clients are handed out through `cracks.metrics.instrument`, so every query
+is timed.  Whatever the backend, they answer the same PostgREST builder
+calls (`table(...).select/upsert/eq/in_`, `rpc(...)`, then `.execute()`).
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+import streamlit as st
+
+from cracks.config import secret, setting
+from cracks.metrics import instrument
+
+POOL_SIZE = 10
+TIMEOUT = 10.0
+KEEPALIVE_EXPIRY = 60.0
+# Latencies kept for the percentiles in `PoolStats.snapshot`.
+LATENCY_WINDOW = 1000
+
+_local = None
+_local_lock = threading.Lock()
+
+
+def backend():
+    return setting("BACKEND", "supabase")
+
+
+class PoolStats:
+    """In-flight requests and latencies of the pooled client."""
+
+    def __init__(self, pool_size):
+        self.pool_size = pool_size
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finished(self, seconds, failed=False):
+        with self._lock:
+            self.in_flight -= 1
+            self.errors += failed
+            self._latencies.append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            in_flight = self.in_flight
+
+            def pct(q):
+                if not latencies:
+                    return 0.0
+                return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+            return {
+                "pool_size": self.pool_size,
+                "in_flight": in_flight,
+                "utilization": in_flight / self.pool_size,
+                "max_in_flight": self.max_in_flight,
+                "requests": self.requests,
+                "errors": self.errors,
+                "latency_p50_ms": pct(0.50) * 1e3,
+                "latency_p95_ms": pct(0.95) * 1e3,
+                "latency_p99_ms": pct(0.99) * 1e3,
+            }
+
+
+def _instrumented_transport(stats, limits):
+    import httpx
+
+    class InstrumentedTransport(httpx.HTTPTransport):
+        def handle_request(self, request):
+            stats.started()
+            start = time.perf_counter()
+            failed = True
+            try:
+                response = super().handle_request(request)
+                failed = response.status_code >= 500
+                return response
+            finally:
+                stats.finished(time.perf_counter() - start, failed)
+
+    return InstrumentedTransport(limits=limits)
+
+
+@st.cache_resource
+def pooled_client(url, key, pool_size=POOL_SIZE, timeout=TIMEOUT):
+    """A PostgREST client on a keep-alive connection pool, one per process."""
+    import httpx
+    from postgrest import SyncPostgrestClient
+
+    client = SyncPostgrestClient(
+        f"{url.rstrip('/')}/rest/v1",
+        headers={"apikey": key, "Authorization": f"Bearer {key}"},
+        timeout=timeout,
+    )
+    stats = PoolStats(pool_size)
+    limits = httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+    # Same base URL and headers, on our pool and instrumented transport.
+    session = client.session
+    client.session = httpx.Client(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=httpx.Timeout(timeout),
+        transport=_instrumented_transport(stats, limits),
+    )
+    session.close()
+    client.pool_stats = stats
+    return client
+
+
+def local_client():
+    """The process-wide `LocalClient`."""
+    global _local
+    with _local_lock:
+        if _local is None:
+            from cracks.localdb import LocalClient
+
+            _local = LocalClient(
+                os.environ.get("CRACKS_LOCAL_DB", ":memory:"),
+                latency=float(os.environ.get("CRACKS_DB_LATENCY", 0)),
+                jitter=float(os.environ.get("CRACKS_DB_JITTER", 0)),
+            )
+        return _local
+
+
+def get_connection():
+    if backend() == "local":
+        return instrument(local_client())
+    url = secret("connections", "supabase", {}).get("SUPABASE_URL")
+    key = secret("connections", "supabase", {}).get("SUPABASE_KEY")
+    if url and key:
+        return instrument(
+            pooled_client(
+                url,
+                key,
+                pool_size=setting("DB_POOL_SIZE", POOL_SIZE),
+                timeout=setting("DB_TIMEOUT", TIMEOUT),
+            )
+        )
+    from philoui.io import conn
+
+    return instrument(conn)
+
+
+def pool_stats():
+    """Utilization and latency of the pooled client, if it is in use."""
+    stats = getattr(get_connection(), "pool_stats", None)
+    return stats.snapshot() if stats is not None else None
+
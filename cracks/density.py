@@ -0,0 +1,114 @@
+"""Spherical kernel density of elastic energy on a lat/lon grid.
+
+The kernel is a von Mises-Fisher (spherical Gaussian) of angular bandwidth
+`bandwidth` degrees, evaluated as `exp(kappa * (cos d - 1))` with
+`kappa = 1 / bandwidth_rad**2`, so that `cos d` is a dot product of unit
+vectors and a whole block of the grid is one matrix product.
+
+Sites are first binned onto a grid four times finer than the output, so the
+cost scales with occupied bins rather than with the catalog size, and the
+product is evaluated in chunks of bins to keep memory bounded.  Results are
+memoized on disk under `CACHE_DIR / "density"` (`cracks.config`), keyed by catalog fingerprint,
+bandwidth and grid resolution.
+"""
+
+import numpy as np
+
+from cracks import config
+from cracks.render_cache import fingerprint
+
+CACHE_DIR = config.CACHE_DIR / "density"
+# Bump when the computation changes, to invalidate memoized fields.
+VERSION = 1
+# Largest (grid cells x bins) block evaluated at once, ~32 MB of float64.
+MAX_BLOCK = 4_000_000
+OVERSAMPLE = 4
+
+
+def unit_vectors(lat, lon):
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], -1)
+
+
+def grid(resolution):
+    """Cell-centre latitudes and longitudes of a global grid."""
+    lat = np.arange(-90 + resolution / 2, 90, resolution)
+    lon = np.arange(-180 + resolution / 2, 180, resolution)
+    return lat, lon
+
+
+def bin_sites(lat, lon, weights, resolution):
+    """Sum `weights` onto a grid of `resolution` degrees; occupied bins only."""
+    lat_edges = np.linspace(-90, 90, int(round(180 / resolution)) + 1)
+    lon_edges = np.linspace(-180, 180, int(round(360 / resolution)) + 1)
+    totals, _, _ = np.histogram2d(
+        lat, lon, bins=(lat_edges, lon_edges), weights=weights
+    )
+    i, j = np.nonzero(totals)
+    centres_lat = (lat_edges[i] + lat_edges[i + 1]) / 2
+    centres_lon = (lon_edges[j] + lon_edges[j + 1]) / 2
+    return centres_lat, centres_lon, totals[i, j]
+
+
+def energy_density(lat, lon, weights, bandwidth=2.9, resolution=1.0):
+    """Kernel density of `weights` on the grid, shape `(n_lat, n_lon)`.
+
+    Values are energy per steradian: the kernel is normalised to unit mass
+    in the small-bandwidth limit.
+    """
+    kappa = 1.0 / np.radians(bandwidth) ** 2
+    bin_lat, bin_lon, bin_weights = bin_sites(
+        lat, lon, weights, resolution / OVERSAMPLE
+    )
+    sources = unit_vectors(bin_lat, bin_lon)
+
+    grid_lat, grid_lon = grid(resolution)
+    mesh_lat, mesh_lon = np.meshgrid(grid_lat, grid_lon, indexing="ij")
+    targets = unit_vectors(mesh_lat.ravel(), mesh_lon.ravel())
+
+    field = np.zeros(len(targets))
+    chunk = max(1, MAX_BLOCK // len(targets))
+    for start in range(0, len(sources), chunk):
+        block = targets @ sources[start : start + chunk].T
+        block -= 1.0
+        block *= kappa
+        np.exp(block, out=block)
+        field += block @ bin_weights[start : start + chunk]
+    field *= kappa / (2 * np.pi)
+    return field.reshape(mesh_lat.shape)
+
+
+def cached_energy_density(catalog, bandwidth=2.9, resolution=1.0):
+    """`energy_density` of a catalog, memoized on disk."""
+    key = fingerprint(VERSION, catalog.fingerprint, bandwidth, resolution)
+    path = CACHE_DIR / f"{key}.npy"
+    if path.exists():
+        return np.load(path)
+    mask = catalog.located()
+    field = energy_density(
+        catalog.lat[mask],
+        catalog.lon[mask],
+        catalog.energy[mask].astype(np.float64),
+        bandwidth=bandwidth,
+        resolution=resolution,
+    )
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Write then rename, so a concurrent reader never sees a partial file.
+    partial = path.with_suffix(f".{id(field)}.tmp.npy")
+    np.save(partial, field)
+    partial.replace(path)
+    return field
+
+
+def field_points(field, resolution=1.0, threshold=0.01):
+    """Grid cells above `threshold` of the peak, as globe point columns."""
+    grid_lat, grid_lon = grid(resolution)
+    peak = field.max() if field.size else 0.0
+    i, j = np.nonzero(field > threshold * peak)
+    return {
+        "lat": grid_lat[i],
+        "lng": grid_lon[j],
+        "energy": field[i, j] / peak * 100 if peak else field[i, j],
+    }
@@ -0,0 +1,72 @@
+"""Process diagnostics, for operators.
+
+Not a page of the sidebar: `app.py` shows it instead of the app when opened
+with `?diagnostics=<DIAGNOSTICS_KEY>` (see `cracks.config.setting`).
+Without the right key, or without a key configured, it shows nothing.
+Figures are per process and refresh every few seconds.
+"""
+
+import hmac
+
+import streamlit as st
+
+from cracks.analytics import analytics_stats
+from cracks.config import setting
+from cracks.connection import pool_stats
+from cracks.metrics import DB_SECONDS, RERUNS, SPAN_ERRORS, SPAN_SECONDS, sessions
+from cracks.render_cache import globe_cache
+from cracks.sessions import get_token_cache
+from cracks.writebehind import get_write_queue
+
+REFRESH = 5
+
+
+def _authorised(given):
+    expected = setting("DIAGNOSTICS_KEY")
+    # Bytes: compare_digest only takes ASCII strings.
+    return bool(expected) and hmac.compare_digest(given.encode(), expected.encode())
+
+
+def _table(title, rows):
+    st.subheader(title)
+    if rows:
+        st.table(rows)
+    else:
+        st.caption("Nothing recorded yet.")
+
+
+@st.fragment(run_every=REFRESH)
+def diagnostics():
+    reruns = {labels["page"]: value for labels, value in RERUNS.samples()}
+    errors = {labels["block"]: value for labels, value in SPAN_ERRORS.samples()}
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Active sessions", sessions.active())
+    col2.metric("Reruns", sum(reruns.values()))
+    col3.metric("Block errors", sum(errors.values()))
+
+    spans = sorted(SPAN_SECONDS.summary(), key=lambda row: row["block"])
+    for row in spans:
+        row["errors"] = errors.get(row["block"], 0)
+    _table("Blocks", spans)
+    _table("Database", DB_SECONDS.summary())
+    _table("Reruns", [{"page": page, "reruns": n} for page, n in reruns.items()])
+
+    st.subheader("Caches and queues")
+    st.json(
+        {
+            "globe render cache": globe_cache.stats(),
+            "connection pool": pool_stats(),
+            "write-behind queue": get_write_queue().stats(),
+            "analytics": analytics_stats(),
+            "session tokens": get_token_cache().stats(),
+        }
+    )
+
+
+def show(given):
+    """The diagnostics, if `given` is the configured key."""
+    if not _authorised(given):
+        return
+    st.title("Diagnostics")
+    diagnostics()
@@ -0,0 +1,150 @@
+"""Prometheus text exposition of `cracks.metrics`.
+
+With `CRACKS_METRICS_PORT` set, the first rerun of a page starts a sidecar
+thread serving `GET /metrics` on that port, on the loopback interface
+unless `CRACKS_METRICS_HOST` says otherwise (e.g. `0.0.0.0` behind a
+firewall that only lets the scraper in).  It exposes every metric of the
+registry, among them:
+
+- `cracks_submission_seconds{table}` / `cracks_submission_write_seconds{table}`
+  for the `cracks-data` and `cryosphere` writes;
+- `cracks_submission_failed_total{table}` (writes in failed flushes) and
+  `cracks_submission_dropped_total{table}` (writes given up on);
+- `cracks_form_submit_errors_total{page,kind}`;
+- `cracks_active_sessions`;
+- `cracks_render_seconds{cache="globe"}`;
+- block, database and rerun metrics from `cracks.metrics`.
+
+Locally, with nothing else running:
+
+    python -m cracks.exporter --port 9464 --demo
+    curl localhost:9464/metrics
+"""
+
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cracks.metrics import ACTIVE_SESSIONS, REGISTRY, sessions
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+HOST = "127.0.0.1"
+
+_server = None
+_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def _number(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def exposition(registry=REGISTRY):
+    """The registry's metrics in the Prometheus text format."""
+    ACTIVE_SESSIONS.set(sessions.active())
+    lines = []
+    for metric in registry.metrics():
+        lines.append(f"# HELP {metric.name} {_escape(metric.help)}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, value in metric.samples():
+            if metric.kind != "histogram":
+                lines.append(f"{metric.name}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.bounds + (math.inf,), value.buckets):
+                cumulative += count
+                le = _labels(labels, le=_number(bound))
+                lines.append(f"{metric.name}_bucket{le} {cumulative}")
+            lines.append(f"{metric.name}_sum{_labels(labels)} {_number(value.sum)}")
+            lines.append(f"{metric.name}_count{_labels(labels)} {value.count}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = exposition().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_exporter(port=None, host=None):
+    """Serve `/metrics` from a daemon thread, once per process.
+
+    Returns the server, or None when no port is configured.
+    """
+    global _server
+    with _lock:
+        if _server is not None:
+            return _server
+        port = port or os.environ.get("CRACKS_METRICS_PORT")
+        if not port:
+            return None
+        host = host or os.environ.get("CRACKS_METRICS_HOST", HOST)
+        _server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+        _server.daemon_threads = True
+        threading.Thread(
+            target=_server.serve_forever, name="metrics-exporter", daemon=True
+        ).start()
+        return _server
+
+
+def _demo():
+    """Fill the registry through the local backend, without Streamlit pages."""
+    import random
+    import time
+
+    from cracks.localdb import LocalClient
+    from cracks.metrics import FORM_SUBMIT_ERRORS, instrument, span
+    from cracks.render_cache import RenderCache
+    from cracks.writebehind import WriteBehindQueue
+
+    queue = WriteBehindQueue(instrument(LocalClient(":memory:", latency=0.02)))
+    cache = RenderCache(maxsize=8, name="globe")
+    for i in range(200):
+        session = f"demo-{i % 20}"
+        sessions.touch(session)
+        with span("demo.rerun"):
+            cache.get_or_render(i % 12, lambda: time.sleep(0.01) or "<html>")
+            queue.submit("cracks-data", "remote_05", session, {"i": i}, merge=False)
+            queue.submit("cryosphere", "nucleation_01", session, {str(i): i})
+        if random.random() < 0.05:
+            FORM_SUBMIT_ERRORS.inc(page="ice", kind="write")
+    queue.flush()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve cracks metrics.")
+    parser.add_argument("--port", type=int, default=9464)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--demo", action="store_true", help="record sample metrics")
+    args = parser.parse_args()
+    start_exporter(args.port, args.host)
+    if args.demo:
+        _demo()
+    print(f"serving http://{args.host}:{args.port}/metrics")
+    threading.Event().wait()
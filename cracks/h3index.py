@@ -0,0 +1,192 @@
+"""H3 hexagonal index over a crack catalog.
+
+Sites are binned once at `FINEST_RESOLUTION`; coarser resolutions are
+derived from the occupied fine cells only, so the per-site work happens a
+single time per catalog.  `Elastic_Energy` is summed per cell and the globe
+receives one weighted point per occupied cell.
+
+`update` folds new sites in without revisiting the old ones: only the new
+sites are binned, and every aggregate already built is merged with their
+contribution.  `version` increases with each update.
+"""
+
+import threading
+
+import numpy as np
+
+from cracks.lazy import lazy_import
+
+# Only the globe page bins sites; the import waits until it does.
+h3 = lazy_import("h3")
+
+FINEST_RESOLUTION = 6
+EARTH_DIAMETER_KM = 12742.0
+# A cell narrower than this many pixels is not worth sending to the browser.
+MIN_CELL_PIXELS = 2
+MAX_POINTS = 20000
+
+
+class CellAggregate:
+    """Energy pre-aggregated over the occupied cells of one resolution."""
+
+    def __init__(self, resolution, cells, energy, count, lat=None, lng=None):
+        self.resolution = resolution
+        self.cells = cells
+        self.energy = energy
+        self.count = count
+        if lat is None:
+            lat, lng = _centers(cells)
+        self.lat = lat
+        self.lng = lng
+
+    def __len__(self):
+        return len(self.cells)
+
+    def points(self, energy_scale=10):
+        """Columns for the globe heatmap, one weighted point per cell."""
+        return {
+            "lat": self.lat,
+            "lng": self.lng,
+            "energy": self.energy * energy_scale,
+            "count": self.count,
+        }
+
+    def merged(self, cells, energy, count):
+        """This aggregate plus per-cell `energy` and `count` on `cells`."""
+        cells, energy, count, old = _merge(
+            self.cells, self.energy, self.count, cells, energy, count
+        )
+        lat = np.empty(len(cells))
+        lng = np.empty(len(cells))
+        lat[old], lng[old] = self.lat, self.lng
+        new = np.ones(len(cells), dtype=bool)
+        new[old] = False
+        lat[new], lng[new] = _centers(cells[new])
+        return CellAggregate(self.resolution, cells, energy, count, lat, lng)
+
+
+def _centers(cells):
+    centers = np.array([h3.h3_to_geo(cell) for cell in cells], dtype=np.float64)
+    centers = centers.reshape(-1, 2)
+    return centers[:, 0], centers[:, 1]
+
+
+def _merge(cells, energy, count, new_cells, new_energy, new_count):
+    """Sum two per-cell tables; also returns where the old cells went."""
+    merged, inverse = np.unique(
+        np.concatenate([cells, new_cells]), return_inverse=True
+    )
+    n = len(merged)
+    energy = np.bincount(
+        inverse, weights=np.concatenate([energy, new_energy]), minlength=n
+    )
+    count = np.bincount(
+        inverse, weights=np.concatenate([count, new_count]), minlength=n
+    ).astype(np.int64)
+    return merged, energy, count, inverse[: len(cells)]
+
+
+def _bin(lat, lon, energy, resolution):
+    """Per-cell energy and site count of the sites, at `resolution`."""
+    fine = [
+        h3.geo_to_h3(a, b, resolution) for a, b in zip(lat.tolist(), lon.tolist())
+    ]
+    cells, inverse = np.unique(np.asarray(fine, dtype=object), return_inverse=True)
+    return (
+        cells,
+        np.bincount(inverse, weights=energy, minlength=len(cells)),
+        np.bincount(inverse, minlength=len(cells)),
+    )
+
+
+class H3Index:
+    """Bins catalog sites into H3 cells and aggregates energy per cell."""
+
+    def __init__(self, catalog, finest=FINEST_RESOLUTION):
+        self.finest = finest
+        self.version = 0
+        # Ingested files already folded in, when they were last looked for,
+        # and the lock held while folding them (see `cracks.ingest`).
+        self.sources = set()
+        self.synced_at = float("-inf")
+        self.sync_lock = threading.Lock()
+        mask = catalog.located()
+        # Collapse sites onto their occupied fine cells; everything coarser
+        # works on these instead of on the raw sites.
+        self._fine_cells, self._fine_energy, self._fine_count = _bin(
+            catalog.lat[mask], catalog.lon[mask], catalog.energy[mask], finest
+        )
+        self._aggregates = {}
+        self._lock = threading.Lock()
+
+    def update(self, lat, lon, energy):
+        """Add sites to the index and to every aggregate built so far."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        energy = np.asarray(energy, dtype=np.float64)
+        mask = np.isfinite(lat) & np.isfinite(lon)
+        if not mask.any():
+            return self.version
+        cells, new_energy, new_count = _bin(
+            lat[mask], lon[mask], energy[mask], self.finest
+        )
+        with self._lock:
+            self._fine_cells, self._fine_energy, self._fine_count, _ = _merge(
+                self._fine_cells,
+                self._fine_energy,
+                self._fine_count,
+                cells,
+                new_energy,
+                new_count,
+            )
+            for resolution, aggregate in self._aggregates.items():
+                parents, inverse = np.unique(
+                    self._parents(cells, resolution), return_inverse=True
+                )
+                n = len(parents)
+                self._aggregates[resolution] = aggregate.merged(
+                    parents,
+                    np.bincount(inverse, weights=new_energy, minlength=n),
+                    np.bincount(inverse, weights=new_count, minlength=n),
+                )
+            self.version += 1
+            return self.version
+
+    def cells(self, resolution):
+        """The `CellAggregate` at `resolution`, computed on first use."""
+        resolution = min(resolution, self.finest)
+        with self._lock:
+            if resolution not in self._aggregates:
+                self._aggregates[resolution] = self._aggregate(resolution)
+            return self._aggregates[resolution]
+
+    def _parents(self, cells, resolution):
+        if resolution == self.finest:
+            return cells
+        return np.array(
+            [h3.h3_to_parent(cell, resolution) for cell in cells], dtype=object
+        )
+
+    def _aggregate(self, resolution):
+        parents = self._parents(self._fine_cells, resolution)
+        cells, inverse = np.unique(parents, return_inverse=True)
+        energy = np.bincount(inverse, weights=self._fine_energy, minlength=len(cells))
+        count = np.bincount(inverse, weights=self._fine_count, minlength=len(cells))
+        return CellAggregate(resolution, cells, energy, count.astype(np.int64))
+
+    def resolution_for_viewport(self, width_px, max_points=MAX_POINTS):
+        """Finest resolution whose cells stay visible and within budget.
+
+        The globe spans roughly `width_px` pixels across the Earth's diameter,
+        so cells whose edge is below `MIN_CELL_PIXELS` pixels only add payload.
+        """
+        km_per_pixel = EARTH_DIAMETER_KM / max(width_px, 1)
+        for resolution in range(self.finest, -1, -1):
+            if h3.edge_length(resolution, unit="km") < km_per_pixel * MIN_CELL_PIXELS:
+                continue
+            if len(self.cells(resolution)) <= max_points:
+                return resolution
+        return 0
+
+    def for_viewport(self, width_px, max_points=MAX_POINTS):
+        return self.cells(self.resolution_for_viewport(width_px, max_points))
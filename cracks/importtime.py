@@ -0,0 +1,137 @@
+"""Import-time report for the app entry points.
+
+    python -m cracks.importtime app.py pages/ice.py [--top 15] [--json]
+    python -m cracks.importtime app.py --baseline importtime.json --tolerance 0.2
+
+The `import` statements at module level of each script are replayed in a
+fresh interpreter under `python -X importtime`, so the total is what a cold
+start pays before the first element can be drawn.  Deferred imports
+(`cracks.lazy`) are not statements and do not count.  With `--baseline`,
+the totals are compared with an earlier `--json` run and the exit status is
+1 when one grew by more than `--tolerance`.
+
+Statements that fail (a package not installed here) are left out of the
+total; the report counts them and marks that total as incomplete, and a
+baseline comparison says so too.
+"""
+
+import argparse
+import ast
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def import_statements(script):
+    """Source of the module-level imports of `script`, including in `if`s."""
+    tree = ast.parse(Path(script).read_text())
+    statements = []
+
+    def visit(body):
+        for node in body:
+            if isinstance(node, (ast.Import, ast.ImportFrom)) and not getattr(node, "level", 0):
+                statements.append(ast.unparse(node))
+            elif isinstance(node, (ast.If, ast.Try, ast.With)):
+                for block in ("body", "orelse", "finalbody"):
+                    visit(getattr(node, block, []))
+                for handler in getattr(node, "handlers", []):
+                    visit(handler.body)
+
+    visit(tree.body)
+    return statements
+
+
+def _importtime(code):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Top-level imports are the ones not indented under another import.
+        if name.startswith(" ") and not name.startswith("  "):
+            modules[name.strip()] = int(cumulative)
+    return modules, result.stdout.splitlines()
+
+
+def measure(script):
+    """Cumulative microseconds per top-level module, and the total.
+
+    Modules the bare interpreter loads at startup are left out; statements
+    that fail (e.g. a package not installed here) are listed under `failed`.
+    """
+    startup, _ = _importtime("pass")
+    code = "\n".join(
+        f"try:\n    {statement}\nexcept Exception:\n    print({statement!r})"
+        for statement in import_statements(script)
+    )
+    modules, failed = _importtime(code)
+    modules = {name: us for name, us in modules.items() if name not in startup}
+    return {
+        "total_us": sum(modules.values()),
+        "modules": modules,
+        "failed": failed,
+        "complete": not failed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scripts", nargs="+")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    reports = {script: measure(script) for script in args.scripts}
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for script, report in reports.items():
+            line = f"{script}: {report['total_us'] / 1e3:.0f} ms to import"
+            if report["failed"]:
+                line += (
+                    f" (incomplete: {len(report['failed'])} imports failed"
+                    " and are not counted)"
+                )
+            print(line)
+            ranked = sorted(report["modules"].items(), key=lambda kv: -kv[1])
+            for name, us in ranked[: args.top]:
+                print(f"  {us / 1e3:>8.1f} ms  {name}")
+            for statement in report["failed"]:
+                print(f"  (failed)     {statement}")
+
+    status = 0
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text())
+        for script, report in reports.items():
+            before = baseline.get(script, {}).get("total_us")
+            if before and report["total_us"] > before * (1 + args.tolerance):
+                print(
+                    f"regression: {script} imports in {report['total_us'] / 1e3:.0f} ms,"
+                    f" baseline {before / 1e3:.0f} ms",
+                    file=sys.stderr,
+                )
+                status = 1
+            if report["failed"]:
+                print(
+                    f"warning: {script}: {len(report['failed'])} imports failed,"
+                    " the comparison leaves them out",
+                    file=sys.stderr,
+                )
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""Append-only ingestion of crack observations and environmental readings.
+
+    python -m cracks.ingest cracks observations.csv more.parquet
+    python -m cracks.ingest environment readings.nc --batch-size 50000
+
+Sources are read as a stream of Arrow record batches of at most
+`batch_size` rows, so memory stays bounded whatever the file size:
+
+- CSV through `pyarrow.csv.open_csv`;
+- Parquet through `ParquetFile.iter_batches`;
+- NetCDF (`.nc`) through `xarray`, if it is installed, one slice of the
+  first dimension at a time.
+
+Each batch is normalised to the columns of its kind (`cracks`: time,
+position, energy and the catalog's string fields; `environment`: time,
+site, position, variable and value; the column names of the
+`cryosphere_cracks` literal are accepted too) and written as new files
+under `INGEST_ROOT/<kind>/`, Hive-partitioned by month.  Nothing is
+rewritten.
+
+`sync_index(index)` folds crack files written since the last call into an
+`H3Index` through `H3Index.update`, so the globe aggregates grow with the
+data instead of being rebuilt.  Folding holds `index.sync_lock`, so a file
+is added exactly once however many sessions sync at the same time.
+"""
+
+import argparse
+import time
+import uuid
+from pathlib import Path
+
+from cracks.catalog import STRING_FIELDS
+from cracks.config import ROOT
+
+INGEST_ROOT = ROOT / "data" / "ingest"
+BATCH_SIZE = 65536
+# Seconds between two scans of the crack partitions by `sync_index`.
+SYNC_INTERVAL = 10.0
+
+# Source column names accepted for each normalised column.
+ALIASES = {
+    "lat": ("lat", "latitude", "Latitude"),
+    "lon": ("lon", "lng", "longitude", "Longitude"),
+    "energy": ("energy", "Elastic_Energy", "elastic_energy"),
+    "observed_at": ("observed_at", "time", "timestamp", "date"),
+    "category": ("category", "Category"),
+    "region": ("region", "Region"),
+    "type": ("type", "Type"),
+    "factors": ("factors", "Contributing Factors"),
+    "impact": ("impact", "Impact"),
+    "significance": ("significance", "Significance"),
+    "site": ("site", "site_id", "station"),
+    "variable": ("variable", "quantity"),
+    "value": ("value",),
+}
+
+
+def _schemas():
+    import pyarrow as pa
+
+    cracks = pa.schema(
+        [
+            ("observed_at", pa.timestamp("us", tz="UTC")),
+            ("lat", pa.float64()),
+            ("lon", pa.float64()),
+            ("energy", pa.float32()),
+        ]
+        + [(field, pa.string()) for field in STRING_FIELDS]
+    )
+    environment = pa.schema(
+        [
+            ("observed_at", pa.timestamp("us", tz="UTC")),
+            ("site", pa.string()),
+            ("lat", pa.float64()),
+            ("lon", pa.float64()),
+            ("variable", pa.string()),
+            ("value", pa.float64()),
+        ]
+    )
+    return {"cracks": cracks, "environment": environment}
+
+
+def read_csv(path, batch_size=BATCH_SIZE):
+    import pyarrow.csv as csv
+
+    # Blocks of ~1 MB; batches are re-cut to `batch_size` rows below.
+    reader = csv.open_csv(path, read_options=csv.ReadOptions(block_size=1 << 20))
+    for batch in reader:
+        yield from _rebatch(batch, batch_size)
+
+
+def read_parquet(path, batch_size=BATCH_SIZE):
+    import pyarrow.parquet as pq
+
+    yield from pq.ParquetFile(path).iter_batches(batch_size=batch_size)
+
+
+def read_netcdf(path, batch_size=BATCH_SIZE):
+    """Rows of a NetCDF dataset, one slice of its first dimension at a time."""
+    try:
+        import xarray as xr
+    except ImportError as e:
+        raise ImportError("Reading NetCDF needs the `xarray` package.") from e
+    import pyarrow as pa
+
+    with xr.open_dataset(path) as ds:
+        dim = next(iter(ds.sizes))
+        # One row per combination of the other dimensions, per step of `dim`.
+        rows_per_step = 1
+        for name, size in ds.sizes.items():
+            if name != dim:
+                rows_per_step *= size
+        step = max(1, batch_size // rows_per_step)
+        for start in range(0, ds.sizes[dim], step):
+            frame = ds.isel({dim: slice(start, start + step)}).to_dataframe()
+            batch = pa.RecordBatch.from_pandas(
+                frame.reset_index(), preserve_index=False
+            )
+            yield from _rebatch(batch, batch_size)
+
+
+READERS = {
+    ".csv": read_csv,
+    ".parquet": read_parquet,
+    ".pq": read_parquet,
+    ".nc": read_netcdf,
+    ".nc4": read_netcdf,
+}
+
+
+def _rebatch(batch, batch_size):
+    for start in range(0, batch.num_rows, batch_size):
+        yield batch.slice(start, batch_size)
+
+
+def read_batches(path, batch_size=BATCH_SIZE):
+    """Record batches of at most `batch_size` rows from `path`."""
+    reader = READERS.get(Path(path).suffix.lower())
+    if reader is None:
+        raise ValueError(f"Unsupported source format: {path}")
+    return reader(path, batch_size)
+
+
+def _column(batch, name):
+    for alias in ALIASES.get(name, (name,)):
+        index = batch.schema.get_field_index(alias)
+        if index >= 0:
+            return batch.column(index)
+    return None
+
+
+def normalise(batch, kind, ingested_at=None):
+    """`batch` as a table of the `kind` schema, plus its `month` partition."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    schema = _schemas()[kind]
+    columns = []
+    for field in schema:
+        column = _column(batch, field.name)
+        if column is None and field.name == "observed_at":
+            now = ingested_at or time.time()
+            column = pa.array([int(now * 1e6)] * batch.num_rows, pa.int64())
+        if column is None:
+            column = pa.nulls(batch.num_rows, field.type)
+        elif pa.types.is_timestamp(field.type) and pa.types.is_string(column.type):
+            # ISO 8601 text; naive times are taken as UTC.
+            column = column.cast(pa.timestamp("us"))
+        columns.append(column.cast(field.type))
+    table = pa.Table.from_arrays(columns, schema=schema)
+    month = pc.strftime(table.column("observed_at"), format="%Y-%m")
+    return table.append_column("month", month)
+
+
+def write_batch(table, kind, root=INGEST_ROOT):
+    """Add `table` to the `kind` dataset as new files; returns their paths."""
+    import pyarrow.dataset as ds
+
+    written = []
+    ds.write_dataset(
+        table,
+        Path(root) / kind,
+        format="parquet",
+        partitioning=["month"],
+        partitioning_flavor="hive",
+        basename_template=f"{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        file_visitor=lambda f: written.append(f.path),
+    )
+    return written
+
+
+def ingest(paths, kind, root=INGEST_ROOT, batch_size=BATCH_SIZE, index=None):
+    """Stream `paths` into the `kind` dataset, batch by batch.
+
+    With an `H3Index`, crack batches are also folded into it as they go.
+    """
+    if kind not in ("cracks", "environment"):
+        raise ValueError(f"Unknown kind of data: {kind!r}")
+    stats = {"rows": 0, "batches": 0, "files": 0}
+    for path in paths:
+        for batch in read_batches(path, batch_size):
+            table = normalise(batch, kind)
+            written = write_batch(table, kind, root)
+            if index is not None and kind == "cracks":
+                with index.sync_lock:
+                    _update_index(index, table)
+                    index.sources.update(written)
+            stats["rows"] += table.num_rows
+            stats["batches"] += 1
+            stats["files"] += len(written)
+    return stats
+
+
+def _update_index(index, table):
+    index.update(
+        table.column("lat").to_numpy(zero_copy_only=False),
+        table.column("lon").to_numpy(zero_copy_only=False),
+        table.column("energy").fill_null(0).to_numpy(zero_copy_only=False),
+    )
+
+
+def sync_index(index, root=INGEST_ROOT, interval=SYNC_INTERVAL):
+    """Fold crack files not yet seen by `index` into it; returns its version.
+
+    The partitions are scanned at most once per `interval` seconds, and by
+    one caller at a time: while another is scanning, the current version is
+    returned without waiting.
+    """
+    import pyarrow.parquet as pq
+
+    if not index.sync_lock.acquire(blocking=False):
+        return index.version
+    try:
+        now = time.monotonic()
+        if now - index.synced_at < interval:
+            return index.version
+        index.synced_at = now
+        directory = Path(root) / "cracks"
+        if not directory.exists():
+            return index.version
+        for path in sorted(map(str, directory.glob("month=*/*.parquet"))):
+            if path in index.sources:
+                continue
+            table = pq.read_table(path, columns=["lat", "lon", "energy"])
+            _update_index(index, table)
+            index.sources.add(path)
+        return index.version
+    finally:
+        index.sync_lock.release()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Append data to the ingest store.")
+    parser.add_argument("kind", choices=("cracks", "environment"))
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--root", type=Path, default=INGEST_ROOT)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+    stats = ingest(args.paths, args.kind, args.root, args.batch_size)
+    print(
+        f"{stats['rows']} rows in {stats['batches']} batches, "
+        f"{stats['files']} files under {args.root / args.kind}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Intro sequence played by the browser instead of a sleeping script.
+
+The intro used to hold the script thread for about twenty seconds per
+visitor (`time.sleep` between phases and between words).  Here the whole
+timeline is computed up front from the word pauses in `cracks.streaming`
+and rendered once as CSS animations; the server only keeps the start time
+in the session and reruns the app when the intro is over.
+
+Timings go into a `<style>` block generated with the markup, one
+`animation-delay` rule per element: inline `style` attributes (and the
+custom properties in them) may be stripped by Markdown sanitising.
+"""
+
+import html
+import time
+
+import streamlit as st
+
+from cracks.streaming import LINE_BREAK, tokenize
+
+CSS = """
+<style>
+.intro { display: grid; animation: intro-collapse 0.01s linear forwards; }
+.intro > div { grid-area: 1 / 1; opacity: 0; }
+.intro .intro-phase, .intro .intro-caption {
+    animation: intro-in 0.4s ease forwards, intro-out 0.4s ease forwards;
+}
+.intro .intro-word { opacity: 0; animation: intro-in 0.3s ease forwards; }
+.intro .intro-caption { grid-area: 2 / 1; font-style: italic; color: #888; }
+.intro .intro-phase p { font-size: 1.6rem; line-height: 1.5; }
+@keyframes intro-in { from { opacity: 0; } to { opacity: 1; } }
+@keyframes intro-out { from { opacity: 1; } to { opacity: 0; } }
+@keyframes intro-collapse { to { max-height: 0; overflow: hidden; } }
+</style>
+"""
+
+
+def _words(text):
+    """HTML for each streamed piece, with `_emphasis_` kept."""
+    pieces = []
+    emphasis = False
+    for piece, pause in tokenize(text):
+        if piece == LINE_BREAK:
+            pieces.append(("<br><br>", pause))
+            continue
+        word = piece.strip().lstrip("#")
+        if not word:
+            pieces.append(("", pause))
+            continue
+        opens = word.startswith("_")
+        closes = word.endswith("_") and (emphasis or opens) and len(word) > 1
+        word = html.escape(word.strip("_"))
+        if opens and not emphasis:
+            emphasis = True
+        if emphasis:
+            word = f"<em>{word}</em>"
+        if closes:
+            emphasis = False
+        pieces.append((word, pause))
+    return pieces
+
+
+class IntroSequence:
+    """Phases of streamed text, each followed by a caption held for `hold` s."""
+
+    def __init__(self, phases, captions, lead=5.0, hold=5.0, lead_caption=""):
+        self.lead = lead
+        self.lead_caption = lead_caption
+        self.phases = []
+        t = lead
+        for text, caption in zip(phases, captions):
+            words = []
+            at = t
+            for word, pause in _words(text):
+                words.append((word, at))
+                at += pause
+            # The caption shows once the text is out, then both go together.
+            self.phases.append(
+                {
+                    "start": t,
+                    "caption_at": at,
+                    "stop": at + hold,
+                    "words": words,
+                    "caption": caption,
+                }
+            )
+            t = at + hold
+        self.duration = t
+
+    def html(self, elapsed=0.0):
+        """The whole sequence, shifted so it resumes `elapsed` seconds in."""
+        end = self._at(self.duration, elapsed)
+        rules = [f"div.intro {{ animation-delay: {end}; }}"]
+        blocks = []
+
+        def element(tag, kind, text, *times):
+            # Rules outrank the generic ones above: one more class, and later.
+            n = len(rules)
+            delays = ", ".join(self._at(t, elapsed) for t in times)
+            rules.append(f".intro .{kind}.intro-t{n} {{ animation-delay: {delays}; }}")
+            return f'<{tag} class="{kind} intro-t{n}">{text}</{tag}>'
+
+        if self.lead_caption:
+            blocks.append(
+                element(
+                    "div", "intro-caption", html.escape(self.lead_caption), 0, self.lead
+                )
+            )
+        for phase in self.phases:
+            words = " ".join(
+                element("span", "intro-word", word, at)
+                for word, at in phase["words"]
+                if word
+            )
+            blocks.append(
+                element(
+                    "div",
+                    "intro-phase",
+                    f"<p>{words}</p>",
+                    phase["start"],
+                    phase["stop"],
+                )
+            )
+            blocks.append(
+                element(
+                    "div",
+                    "intro-caption",
+                    html.escape(phase["caption"]),
+                    phase["caption_at"],
+                    phase["stop"],
+                )
+            )
+        return (
+            CSS
+            + "<style>\n"
+            + "\n".join(rules)
+            + "\n</style>"
+            + '<div class="intro">'
+            + "".join(blocks)
+            + "</div>"
+        )
+
+    @staticmethod
+    def _at(t, elapsed):
+        return f"{t - elapsed:.2f}s"
+
+
+def play(sequence, started_key="intro_started_at", done_key="intro_done"):
+    """Show `sequence` without blocking; return True once it has finished.
+
+    The start time lives in the session, so a rerun in the middle of the
+    intro resumes it where it was.  A fragment ticks once when the intro is
+    due to end and reruns the app with `done_key` set.
+    """
+    if st.session_state.get(done_key):
+        return True
+    if started_key not in st.session_state:
+        st.session_state[started_key] = time.time()
+    started = st.session_state[started_key]
+    remaining = sequence.duration - (time.time() - started)
+    if remaining <= 0:
+        st.session_state[done_key] = True
+        return True
+
+    @st.fragment(run_every=max(remaining, 0.5))
+    def _intro():
+        elapsed = time.time() - started
+        if elapsed >= sequence.duration:
+            st.session_state[done_key] = True
+            st.rerun()
+        st.markdown(sequence.html(elapsed), unsafe_allow_html=True)
+
+    _intro()
+    return False
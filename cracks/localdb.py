@@ -0,0 +1,291 @@
+"""Local stand-in for the Supabase/PostgREST client, backed by SQLite.
+
+`LocalClient` offers the query-builder surface the pages use
+(`table(...).select/eq/in_/upsert/insert/update/delete(...).execute()`), so
+`cracks-data`, `cryosphere` and `discourse-data` can be exercised offline.
+Every `execute()` is one simulated round trip: it sleeps for the injected
+latency and is counted, per table and operation, in `stats()`.
+
+Tables are keyed by `signature` and grow a TEXT column the first time a row
+carries a new key.  Dicts and lists are stored as JSON text.  The stored
+procedures in `sql/` are mirrored as `_rpc_<name>` methods, reachable
+through `rpc(name, params)`.
+"""
+
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+TABLES = ("cracks-data", "cryosphere", "discourse-data")
+
+
+class LocalResponse:
+    """Like postgrest's `APIResponse`: `data` rows and an optional `count`."""
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+    def __repr__(self):
+        return f"LocalResponse(data={self.data!r}, count={self.count!r})"
+
+
+class LocalQuery:
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._operation = "select"
+        self._columns = "*"
+        self._payload = None
+        self._filters = []
+        self._order = None
+        self._limit = None
+        self._count = None
+
+    def select(self, *columns, count=None):
+        self._operation = "select"
+        self._columns = ",".join(columns) or "*"
+        self._count = count
+        return self
+
+    def insert(self, json, **kwargs):
+        self._operation = "insert"
+        self._payload = json
+        return self
+
+    def upsert(self, json, on_conflict="signature", **kwargs):
+        self._operation = "upsert"
+        self._payload = json
+        return self
+
+    def update(self, json, **kwargs):
+        self._operation = "update"
+        self._payload = json
+        return self
+
+    def delete(self, **kwargs):
+        self._operation = "delete"
+        return self
+
+    def eq(self, column, value):
+        self._filters.append((column, value))
+        return self
+
+    def in_(self, column, values):
+        self._filters.append((column, tuple(values)))
+        return self
+
+    def order(self, column, desc=False):
+        self._order = (column, desc)
+        return self
+
+    def limit(self, size):
+        self._limit = size
+        return self
+
+    def execute(self):
+        return self._client._execute(self)
+
+
+class LocalRPC:
+    def __init__(self, client, function, params):
+        self._client = client
+        self._function = function
+        self._params = params
+
+    def execute(self):
+        return self._client._call(self._function, self._params)
+
+
+class LocalClient:
+    """SQLite-backed client with injected per-request latency."""
+
+    def __init__(self, path=":memory:", latency=0.0, jitter=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._columns = {}
+        self._round_trips = Counter()
+        for table in TABLES:
+            self._ensure_table(table)
+
+    def table(self, name):
+        return LocalQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, function, params=None):
+        return LocalRPC(self, function, params or {})
+
+    def stats(self):
+        """Round trips so far, in total and by `table.operation`."""
+        with self._lock:
+            by_call = {
+                f"{table}.{op}": n for (table, op), n in self._round_trips.items()
+            }
+        return {"round_trips": sum(by_call.values()), "by_call": by_call}
+
+    def reset_stats(self):
+        with self._lock:
+            self._round_trips.clear()
+
+    def _wait(self, table, operation):
+        with self._lock:
+            self._round_trips[table, operation] += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _ensure_table(self, table):
+        if table not in self._columns:
+            self._db.execute(
+                f'CREATE TABLE IF NOT EXISTS "{table}" (signature TEXT PRIMARY KEY)'
+            )
+            info = self._db.execute(f'PRAGMA table_info("{table}")').fetchall()
+            self._columns[table] = {row["name"] for row in info}
+        return self._columns[table]
+
+    def _ensure_columns(self, table, names):
+        columns = self._ensure_table(table)
+        for name in names:
+            if name not in columns:
+                self._db.execute(f'ALTER TABLE "{table}" ADD COLUMN "{name}" TEXT')
+                columns.add(name)
+
+    @staticmethod
+    def _encode(value):
+        return json.dumps(value) if isinstance(value, (dict, list)) else value
+
+    def _where(self, filters):
+        if not filters:
+            return "", []
+        clauses, params = [], []
+        for column, value in filters:
+            if isinstance(value, tuple):
+                # `in_`: a tuple of accepted values.
+                marks = ", ".join("?" for _ in value)
+                clauses.append(f'"{column}" IN ({marks})' if value else "0")
+                params.extend(value)
+            else:
+                clauses.append(f'"{column}" = ?')
+                params.append(value)
+        return f" WHERE {' AND '.join(clauses)}", params
+
+    def _execute(self, query):
+        self._wait(query._table, query._operation)
+        with self._lock, self._db:
+            self._ensure_table(query._table)
+            handler = getattr(self, f"_{query._operation}")
+            return handler(query)
+
+    def _call(self, function, params):
+        self._wait("rpc", function)
+        with self._lock, self._db:
+            return LocalResponse(getattr(self, f"_rpc_{function}")(**params))
+
+    def _rpc_merge_json_field(self, p_table, p_column, p_signature, p_patch):
+        """`sql/merge_json_field.sql`: shallow merge, True if the row existed."""
+        self._ensure_columns(p_table, [p_column])
+        row = self._db.execute(
+            f'SELECT "{p_column}" FROM "{p_table}" WHERE signature = ?',
+            [p_signature],
+        ).fetchone()
+        stored = json.loads(row[p_column] or "{}") if row is not None else {}
+        self._db.execute(
+            f'INSERT INTO "{p_table}" (signature, "{p_column}") VALUES (?, ?) '
+            f'ON CONFLICT(signature) DO UPDATE SET "{p_column}" = '
+            f'excluded."{p_column}"',
+            [p_signature, json.dumps({**stored, **p_patch})],
+        )
+        return row is not None
+
+    def _rpc_merge_json_fields(self, p_table, p_column, p_rows):
+        """`sql/merge_json_fields.sql`: signatures of the rows that existed."""
+        return [
+            row["signature"]
+            for row in p_rows
+            if self._rpc_merge_json_field(
+                p_table, p_column, row["signature"], row["patch"]
+            )
+        ]
+
+    def _select(self, query):
+        table = query._table
+        columns = self._columns[table]
+        wanted = [c.strip() for c in query._columns.split(",")]
+        if wanted == ["*"]:
+            projection = "*"
+        else:
+            # Unknown columns read as null, as they would on a wider table.
+            projection = ", ".join(
+                f'"{c}"' if c in columns else f'NULL AS "{c}"' for c in wanted
+            )
+        filters = [(c, v) for c, v in query._filters if c in columns]
+        if len(filters) < len(query._filters):
+            return LocalResponse([], 0 if query._count else None)
+        where, params = self._where(filters)
+        sql = f'SELECT {projection} FROM "{table}"{where}'
+        if query._order is not None:
+            column, desc = query._order
+            sql += f' ORDER BY "{column}"{" DESC" if desc else ""}'
+        if query._limit is not None:
+            sql += f" LIMIT {int(query._limit)}"
+        rows = [dict(row) for row in self._db.execute(sql, params)]
+        return LocalResponse(rows, len(rows) if query._count else None)
+
+    def _write(self, query, conflict):
+        rows = query._payload
+        if not isinstance(rows, list):
+            rows = [rows]
+        written = []
+        for row in rows:
+            self._ensure_columns(query._table, row)
+            names = list(row)
+            quoted = ", ".join(f'"{name}"' for name in names)
+            marks = ", ".join("?" for _ in names)
+            sql = f'INSERT INTO "{query._table}" ({quoted}) VALUES ({marks})'
+            if conflict:
+                updates = ", ".join(
+                    f'"{name}" = excluded."{name}"'
+                    for name in names
+                    if name != "signature"
+                )
+                sql += (
+                    f" ON CONFLICT(signature) DO UPDATE SET {updates}"
+                    if updates
+                    else " ON CONFLICT(signature) DO NOTHING"
+                )
+            self._db.execute(sql, [self._encode(row[name]) for name in names])
+            written.append(dict(row))
+        return LocalResponse(written)
+
+    def _insert(self, query):
+        return self._write(query, conflict=False)
+
+    def _upsert(self, query):
+        return self._write(query, conflict=True)
+
+    def _update(self, query):
+        self._ensure_columns(query._table, query._payload)
+        names = list(query._payload)
+        assignments = ", ".join(f'"{name}" = ?' for name in names)
+        where, params = self._where(query._filters)
+        self._db.execute(
+            f'UPDATE "{query._table}" SET {assignments}{where}',
+            [self._encode(query._payload[name]) for name in names] + params,
+        )
+        selection = LocalQuery(self, query._table)
+        selection._filters = list(query._filters)
+        return self._select(selection)
+
+    def _delete(self, query):
+        where, params = self._where(query._filters)
+        rows = self._select(query).data
+        self._db.execute(f'DELETE FROM "{query._table}"{where}', params)
+        return LocalResponse(rows)
+
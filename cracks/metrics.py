@@ -0,0 +1,320 @@
+"""Per-process metrics: counters, gauges and latency histograms.
+
+Metrics live in a `Registry` and may carry labels, e.g.
+`REGISTRY.histogram("span_seconds", "...", ["block"])`.  A histogram keeps
+cumulative bucket counts (for exposition) and a window of recent
+observations (for percentiles); an observation takes a lock and a few
+additions.
+
+Code is timed with `span`, as a context manager or through `timed`:
+
+    with span("ice.marquee"):
+        ...
+
+    @timed("ice.energy_globe_cracks")
+    def energy_globe_cracks(...):
+
+`instrument(conn)` wraps a database client so that every `.execute()` of
+its query builders goes into `cracks_db_seconds`, labelled by table or
+procedure.  `record_rerun(page)` counts reruns and marks the session as
+active.
+"""
+
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# Seconds; the last bucket is +Inf.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Observations kept per label set for percentiles.
+WINDOW = 2048
+# A session counts as active this many seconds after its last rerun.
+ACTIVE_WINDOW = 300.0
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """`(labels, value)` pairs, labels as a dict."""
+        with self._lock:
+            items = list(self._values.items())
+        return [(dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "count", "sum", "recent")
+
+    def __init__(self, n_buckets):
+        self.buckets = [0] * n_buckets
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=WINDOW)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = _HistogramValue(len(self.bounds) + 1)
+            entry.buckets[bisect.bisect_left(self.bounds, value)] += 1
+            entry.count += 1
+            entry.sum += value
+            entry.recent.append(value)
+
+    def samples(self):
+        """`(labels, value)` pairs, each value a consistent copy."""
+        with self._lock:
+            items = []
+            for key, entry in self._values.items():
+                copy = _HistogramValue(len(entry.buckets))
+                copy.buckets = list(entry.buckets)
+                copy.count, copy.sum = entry.count, entry.sum
+                items.append((key, copy))
+        return [(dict(zip(self.labelnames, key)), value) for key, value in items]
+
+    def summary(self, quantiles=(0.5, 0.95, 0.99)):
+        """Count, mean and recent percentiles (ms) per label set."""
+        rows = []
+        with self._lock:
+            items = [
+                (key, entry.count, entry.sum, sorted(entry.recent))
+                for key, entry in self._values.items()
+            ]
+        for key, count, total, recent in items:
+            row = dict(zip(self.labelnames, key))
+            row["count"] = count
+            row["mean_ms"] = total / count * 1e3 if count else 0.0
+            for q in quantiles:
+                value = recent[min(len(recent) - 1, int(q * len(recent)))]
+                row[f"p{round(q * 100)}_ms"] = value * 1e3
+            rows.append(row)
+        return rows
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already a {metric.kind}")
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._get(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._get(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=BUCKETS):
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+
+REGISTRY = Registry()
+
+SPAN_SECONDS = REGISTRY.histogram(
+    "cracks_span_seconds", "Time spent in instrumented blocks.", ["block"]
+)
+SPAN_ERRORS = REGISTRY.counter(
+    "cracks_span_errors_total", "Instrumented blocks that raised.", ["block"]
+)
+DB_SECONDS = REGISTRY.histogram(
+    "cracks_db_seconds", "Database round trips.", ["call", "target"]
+)
+RERUNS = REGISTRY.counter("cracks_reruns_total", "Script reruns.", ["page"])
+FORM_SUBMIT_ERRORS = REGISTRY.counter(
+    "cracks_form_submit_errors_total",
+    "Failed survey submissions, by page and kind of error.",
+    ["page", "kind"],
+)
+ACTIVE_SESSIONS = REGISTRY.gauge(
+    "cracks_active_sessions", f"Sessions rerun in the last {ACTIVE_WINDOW:.0f} s."
+)
+
+
+@contextmanager
+def span(block):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        # Streamlit's rerun and stop signals derive from BaseException.
+        SPAN_ERRORS.inc(block=block)
+        raise
+    finally:
+        SPAN_SECONDS.observe(time.perf_counter() - start, block=block)
+
+
+def timed(block=None):
+    """Decorator running the function inside `span(block)`."""
+
+    def decorate(fn):
+        name = block or f"{fn.__module__}.{fn.__qualname__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+class _Builder:
+    """Query builder stand-in timing `execute()`."""
+
+    def __init__(self, builder, call, target):
+        self._builder = builder
+        self._call = call
+        self._target = target
+
+    def __getattr__(self, attr):
+        value = getattr(self._builder, attr)
+        if not callable(value):
+            return value
+
+        @wraps(value)
+        def chained(*args, **kwargs):
+            result = value(*args, **kwargs)
+            if hasattr(result, "execute"):
+                return _Builder(result, self._call, self._target)
+            return result
+
+        return chained
+
+    def execute(self):
+        start = time.perf_counter()
+        try:
+            return self._builder.execute()
+        finally:
+            DB_SECONDS.observe(
+                time.perf_counter() - start, call=self._call, target=self._target
+            )
+
+
+class InstrumentedClient:
+    """Database client whose queries and procedure calls are timed."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, attr):
+        return getattr(self._client, attr)
+
+    def table(self, name):
+        return _Builder(self._client.table(name), "table", name)
+
+    from_ = table
+
+    def rpc(self, name, params=None, *args, **kwargs):
+        return _Builder(self._client.rpc(name, params, *args, **kwargs), "rpc", name)
+
+
+def instrument(client):
+    if isinstance(client, InstrumentedClient):
+        return client
+    return InstrumentedClient(client)
+
+
+class SessionTracker:
+    """Sessions seen within `window` seconds."""
+
+    def __init__(self, window=ACTIVE_WINDOW):
+        self.window = window
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def touch(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            # Re-inserted so `_seen` stays ordered by last touch.
+            self._seen.pop(session_id, None)
+            self._seen[session_id] = now
+            self._prune(now)
+
+    def active(self):
+        with self._lock:
+            self._prune(time.monotonic())
+            return len(self._seen)
+
+    def _prune(self, now):
+        # Oldest first: stop at the first session still within the window.
+        cutoff = now - self.window
+        while self._seen:
+            session_id, seen = next(iter(self._seen.items()))
+            if seen >= cutoff:
+                break
+            del self._seen[session_id]
+
+
+sessions = SessionTracker()
+
+
+def record_rerun(page):
+    """Count a rerun of `page` and mark the current session active."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    RERUNS.inc(page=page)
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        sessions.touch(ctx.session_id)
@@ -0,0 +1,314 @@
+"""Tiled, memory-mapped image pyramids for large scans.
+
+An image is converted once into a pyramid under
+`PYRAMID_ROOT/<digest>/`: level 0 is the full resolution and each level
+halves the previous one (2x2 mean) until it fits in one tile.  Every level
+is one `.npy` file laid out tile by tile, with shape
+`(rows, cols, TILE, TILE, 3)`, so a tile is one contiguous region of the
+file.  Levels are opened with `np.load(mmap_mode="r")`: sessions read tiles
+through the shared page cache and nothing else is held in memory.
+
+`viewer` sends only the tiles under the viewport (`visible_tiles`), each
+encoded once into `tile_cache`, an LRU shared by every session, and laid
+out by the browser.  Levels are written tile row by tile row (level 0) or
+tile by tile (the others); the decoder still needs the source image in
+memory once, during `build_pyramid(data)`.
+
+`build_pyramid` keeps Pillow's decompression-bomb guard
+(`Image.MAX_IMAGE_PIXELS`, about 179 Mpx).  Larger scans are built offline,
+in their own process:
+
+    python -m cracks.pyramid scan.tif --max-pixels 4000000000
+
+A pyramid is written to a temporary directory and renamed into place, so
+readers never see a partial one and builds of different images (or in
+different processes) do not wait for each other.
+
+There is no page for pyramids: one that accepts uploads must sign users in,
+keep their pyramids apart and bound the disk they use.
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import math
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+
+import numpy as np
+import streamlit as st
+
+from cracks.config import CACHE_DIR
+from cracks.render_cache import RenderCache
+
+PYRAMID_ROOT = CACHE_DIR / "pyramids"
+TILE = 256
+# Default of `--max-pixels` for offline builds.
+MAX_PIXELS = 4_000_000_000
+TILE_FORMAT = "WEBP"
+
+tile_cache = RenderCache(maxsize=2048, name="tiles")
+# One lock per digest being built, so an image is decoded once at a time.
+_building = {}
+_building_lock = threading.Lock()
+
+
+def digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _tiles(n):
+    return max(1, math.ceil(n / TILE))
+
+
+def _open_level(path, shape):
+    return np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=shape)
+
+
+def _write_level0(image, path):
+    width, height = image.size
+    rows, cols = _tiles(height), _tiles(width)
+    level = _open_level(path, (rows, cols, TILE, TILE, 3))
+    for row in range(rows):
+        top = row * TILE
+        strip = np.asarray(
+            image.crop((0, top, cols * TILE, top + TILE)).convert("RGB")
+        )
+        level[row] = strip.reshape(TILE, cols, TILE, 3).swapaxes(0, 1)
+    level.flush()
+    return width, height
+
+
+def _write_halved(source, path, width, height):
+    """Next level from `source`, one 2x2 block of source tiles at a time."""
+    width, height = max(1, width // 2), max(1, height // 2)
+    rows, cols = _tiles(height), _tiles(width)
+    level = _open_level(path, (rows, cols, TILE, TILE, 3))
+    block = np.zeros((2 * TILE, 2 * TILE, 3), dtype=np.uint16)
+    for row in range(rows):
+        for col in range(cols):
+            block[:] = 0
+            for dr in (0, 1):
+                for dc in (0, 1):
+                    r, c = 2 * row + dr, 2 * col + dc
+                    if r < source.shape[0] and c < source.shape[1]:
+                        block[
+                            dr * TILE : (dr + 1) * TILE, dc * TILE : (dc + 1) * TILE
+                        ] = source[r, c]
+            level[row, col] = block.reshape(TILE, 2, TILE, 2, 3).sum(axis=(1, 3)) // 4
+    level.flush()
+    return width, height
+
+
+def _write_pyramid(data, directory):
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = _write_level0(image, directory / "level_0.npy")
+    sizes = [(width, height)]
+    while max(sizes[-1]) > TILE:
+        level = len(sizes)
+        source = np.load(directory / f"level_{level - 1}.npy", mmap_mode="r")
+        sizes.append(
+            _write_halved(source, directory / f"level_{level}.npy", *sizes[-1])
+        )
+    (directory / "meta.json").write_text(json.dumps({"tile": TILE, "sizes": sizes}))
+
+
+def build_pyramid(data, root=PYRAMID_ROOT):
+    """Pyramid of the image file `data` (bytes); returns its digest.
+
+    Building is skipped when a pyramid of the same bytes exists.  Raises
+    Pillow's `DecompressionBombError` for images over twice
+    `Image.MAX_IMAGE_PIXELS`.
+    """
+    key = digest(data)
+    directory = Path(root) / key
+    if (directory / "meta.json").exists():
+        return key
+    with _building_lock:
+        lock = _building.setdefault(key, threading.Lock())
+    try:
+        with lock:
+            if (directory / "meta.json").exists():
+                return key
+            scratch = Path(root) / f".{key}.{uuid.uuid4().hex}"
+            scratch.mkdir(parents=True)
+            try:
+                _write_pyramid(data, scratch)
+                try:
+                    os.rename(scratch, directory)
+                except OSError:
+                    # Built meanwhile by another process.
+                    if not (directory / "meta.json").exists():
+                        raise
+            finally:
+                shutil.rmtree(scratch, ignore_errors=True)
+    finally:
+        with _building_lock:
+            _building.pop(key, None)
+    return key
+
+
+class Pyramid:
+    def __init__(self, key, root=PYRAMID_ROOT):
+        self.key = key
+        directory = Path(root) / key
+        meta = json.loads((directory / "meta.json").read_text())
+        self.tile_size = meta["tile"]
+        self.sizes = [tuple(size) for size in meta["sizes"]]
+        self.levels = [
+            np.load(directory / f"level_{i}.npy", mmap_mode="r")
+            for i in range(len(self.sizes))
+        ]
+
+    def __len__(self):
+        return len(self.levels)
+
+    def level_for_zoom(self, zoom):
+        """Coarsest level with at least `zoom` pixels per level-0 pixel."""
+        if zoom >= 1:
+            return 0
+        return min(len(self.levels) - 1, int(math.floor(math.log2(1 / zoom))))
+
+    def visible_tiles(self, level, x, y, width, height):
+        """`(row, col)` of the tiles under a viewport, in level pixels."""
+        rows, cols = self.levels[level].shape[:2]
+        t = self.tile_size
+        row_range = range(max(0, y // t), min(rows, _ceil_div(y + height, t)))
+        col_range = range(max(0, x // t), min(cols, _ceil_div(x + width, t)))
+        return [(row, col) for row in row_range for col in col_range]
+
+    def tile(self, level, row, col):
+        """One tile as a read-only view of the memory map."""
+        return self.levels[level][row, col]
+
+    def tile_bytes(self, level, row, col, format=TILE_FORMAT):
+        """One encoded tile, through the shared `tile_cache`."""
+
+        def encode():
+            from PIL import Image
+
+            buffer = io.BytesIO()
+            Image.fromarray(np.asarray(self.tile(level, row, col))).save(
+                buffer, format=format
+            )
+            return buffer.getvalue()
+
+        return tile_cache.get_or_render((self.key, level, row, col, format), encode)
+
+    def viewport(self, level, x, y, width, height):
+        """The pixels of a viewport, read from its visible tiles only."""
+        t = self.tile_size
+        level_width, level_height = self.sizes[level]
+        width = min(width, level_width - x)
+        height = min(height, level_height - y)
+        out = np.zeros((max(height, 0), max(width, 0), 3), dtype=np.uint8)
+        for row, col in self.visible_tiles(level, x, y, width, height):
+            top, left = row * t - y, col * t - x
+            src = self.tile(level, row, col)
+            dy0, dx0 = max(top, 0), max(left, 0)
+            dy1, dx1 = min(top + t, height), min(left + t, width)
+            out[dy0:dy1, dx0:dx1] = src[dy0 - top : dy1 - top, dx0 - left : dx1 - left]
+        return out
+
+
+def _ceil_div(a, b):
+    return -(-a // b)
+
+
+@st.cache_resource
+def open_pyramid(key, root=PYRAMID_ROOT):
+    """The `Pyramid` of `key`, memory-mapped once per process."""
+    return Pyramid(key, root)
+
+
+def _data_url(data, format):
+    return f"data:image/{format.lower()};base64,{base64.b64encode(data).decode()}"
+
+
+def tiles_html(pyramid, level, x, y, view_w, view_h, scale, format=TILE_FORMAT):
+    """The visible tiles of a viewport, laid out as scaled `<img>` elements.
+
+    Tiles come from `tile_bytes`, so each is encoded once per process.
+    """
+    t = pyramid.tile_size
+    images = []
+    for row, col in pyramid.visible_tiles(level, x, y, view_w, view_h):
+        src = _data_url(pyramid.tile_bytes(level, row, col, format), format)
+        images.append(
+            f'<img src="{src}" style="position:absolute;'
+            f"left:{(col * t - x) * scale:.2f}px;top:{(row * t - y) * scale:.2f}px;"
+            f'width:{t * scale:.2f}px;height:{t * scale:.2f}px">'
+        )
+    width, height = math.ceil(view_w * scale), math.ceil(view_h * scale)
+    return (
+        f'<div style="position:relative;overflow:hidden;width:{width}px;'
+        f'height:{height}px;image-rendering:auto">{"".join(images)}</div>'
+    )
+
+
+def viewer(key, width=700, height=500, widget_key="pyramid"):
+    """Zoom and pan controls over a pyramid, showing only the visible part.
+
+    The visible tiles are sent as they are cached (`tiles_html`); the
+    viewport is assembled server-side (`Pyramid.viewport`) only if they
+    cannot be encoded.
+    """
+    import streamlit.components.v1 as components
+
+    pyramid = open_pyramid(key)
+    full_width, full_height = pyramid.sizes[0]
+    fit = min(width / full_width, height / full_height, 1.0)
+    zoom = st.select_slider(
+        "Zoom",
+        options=sorted({fit, *(2.0**-i for i in range(len(pyramid))), 1.0}),
+        value=fit,
+        format_func=lambda z: f"{z:.0%}",
+        key=f"{widget_key}_zoom",
+    )
+    level = pyramid.level_for_zoom(zoom)
+    level_width, level_height = pyramid.sizes[level]
+    scale = zoom * 2**level
+    view_w = min(level_width, math.ceil(width / scale))
+    view_h = min(level_height, math.ceil(height / scale))
+    col1, col2 = st.columns(2)
+    cx = col1.slider("x", 0.0, 1.0, 0.5, key=f"{widget_key}_x")
+    cy = col2.slider("y", 0.0, 1.0, 0.5, key=f"{widget_key}_y")
+    x = int(cx * (level_width - view_w))
+    y = int(cy * (level_height - view_h))
+    try:
+        html = tiles_html(pyramid, level, x, y, view_w, view_h, scale)
+    except (OSError, KeyError, ValueError):
+        # No encoder for `TILE_FORMAT` in this Pillow build.
+        st.image(pyramid.viewport(level, x, y, view_w, view_h), width=width)
+        return
+    components.html(html, height=math.ceil(view_h * scale) + 8)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the pyramid of a scan.")
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--root", type=Path, default=PYRAMID_ROOT)
+    parser.add_argument(
+        "--max-pixels",
+        type=int,
+        default=MAX_PIXELS,
+        help="decompression-bomb guard for this build (Pillow's is ~179 Mpx)",
+    )
+    args = parser.parse_args(argv)
+    from PIL import Image
+
+    # This process only builds the one image it was given.
+    Image.MAX_IMAGE_PIXELS = args.max_pixels
+    key = build_pyramid(args.path.read_bytes(), args.root)
+    print(f"{args.path}: pyramid {key} under {args.root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Process-wide cache of rendered globe HTML.
+
+Globe iframes are keyed by a content hash of their data and options, so a
+rerun that would produce the same HTML costs one dictionary lookup.  The
+cache is bounded and evicts the least recently used entry.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from cracks.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Log the counters every this many lookups.
+REPORT_EVERY = 500
+
+RENDER_SECONDS = REGISTRY.histogram(
+    "cracks_render_seconds", "Time to render a cache miss.", ["cache"]
+)
+
+
+def fingerprint(*parts):
+    """Content hash of arrays, bytes, strings and JSON-serialisable values."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            h.update(str(part.dtype).encode())
+            h.update(np.ascontiguousarray(part).tobytes())
+        elif isinstance(part, bytes):
+            h.update(part)
+        elif isinstance(part, str):
+            h.update(part.encode())
+        else:
+            h.update(json.dumps(part, sort_keys=True, default=str).encode())
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+class RenderCache:
+    """Bounded LRU mapping from fingerprint to rendered HTML."""
+
+    def __init__(self, maxsize=64, name="render"):
+        self.maxsize = maxsize
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        """Return the entry for `key`, calling `render()` to build it on a miss."""
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self._report()
+                return html
+            self.misses += 1
+            self._report()
+        # Render outside the lock; two sessions missing on the same key at
+        # once both render, which is harmless.
+        start = time.perf_counter()
+        html = render()
+        RENDER_SECONDS.observe(time.perf_counter() - start, cache=self.name)
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _report(self):
+        lookups = self.hits + self.misses
+        if lookups % REPORT_EVERY == 0:
+            logger.info(
+                "%s cache: %d hits, %d misses, %d entries",
+                self.name,
+                self.hits,
+                self.misses,
+                len(self._entries),
+            )
+
+
+globe_cache = RenderCache(maxsize=64, name="globe")
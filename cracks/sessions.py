@@ -0,0 +1,175 @@
+"""Signed session tokens, so a verified access key is not re-checked.
+
+After a successful `authenticator.login`, `remember_session` issues a token
+and stores it in the `cracks_session` browser cookie.  A later session from
+the same browser (a reload, a new tab) presents the cookie, and
+`restore_session` accepts it with an HMAC comparison and a dictionary
+lookup, without hashing the key or querying the database again.
+
+A token is `<nonce>.<expiry>.<signature>`: the access key never leaves the
+server; it is kept in a bounded, process-wide `TokenCache` next to the
+nonce.  Tokens expire after `ttl` seconds, the oldest are dropped beyond
+`maxsize`, and `logout` revokes every token of the user, in all their
+browsers.  The signing secret is the `SESSION_SECRET` setting
+(`cracks.config.setting`); without one a random secret is drawn per
+process, and tokens simply stop verifying after a restart.
+
+The cookie is `SameSite=Strict`, and `Secure` when the page is served over
+https.  It cannot be `HttpOnly`: Streamlit gives the script no say over
+response headers, so the cookie is written by JavaScript in the page, and
+cookies set from JavaScript are readable from JavaScript.
+"""
+
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from cracks.config import setting
+
+COOKIE = "cracks_session"
+TTL = 12 * 3600.0
+MAXSIZE = 10000
+
+
+class TokenCache:
+    """Issued tokens, verified by signature and looked up by nonce."""
+
+    def __init__(self, secret, ttl=TTL, maxsize=MAXSIZE):
+        self._secret = secret
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.verified = 0
+        self.rejected = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sign(self, message):
+        return hmac.new(self._secret, message.encode(), hashlib.sha256).hexdigest()
+
+    def issue(self, username, name=None):
+        """A token for `username`, valid for `ttl` seconds."""
+        nonce = secrets.token_urlsafe(16)
+        expiry = int(time.time() + self.ttl)
+        message = f"{nonce}.{expiry}"
+        with self._lock:
+            self._entries[nonce] = (username, name, expiry)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return f"{message}.{self._sign(message)}"
+
+    def verify(self, token):
+        """`(username, name)` for a valid, unrevoked `token`, else None."""
+        try:
+            nonce, expiry, signature = token.split(".")
+            expired = int(expiry) < time.time()
+        except (AttributeError, ValueError):
+            expired = True
+        with self._lock:
+            if expired or not hmac.compare_digest(
+                signature, self._sign(f"{nonce}.{expiry}")
+            ):
+                self.rejected += 1
+                return None
+            entry = self._entries.get(nonce)
+            if entry is None or entry[2] < time.time():
+                self._entries.pop(nonce, None)
+                self.rejected += 1
+                return None
+            self.verified += 1
+            return entry[0], entry[1]
+
+    def revoke(self, token):
+        """Forget `token`; later `verify` calls reject it."""
+        nonce = str(token).split(".")[0]
+        with self._lock:
+            return self._entries.pop(nonce, None) is not None
+
+    def revoke_user(self, username):
+        """Forget every token issued to `username`."""
+        with self._lock:
+            nonces = [n for n, e in self._entries.items() if e[0] == username]
+            for nonce in nonces:
+                del self._entries[nonce]
+        return len(nonces)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "verified": self.verified,
+                "rejected": self.rejected,
+                "evictions": self.evictions,
+            }
+
+
+@st.cache_resource
+def get_token_cache():
+    secret = setting("SESSION_SECRET")
+    secret = secret.encode() if secret else secrets.token_bytes(32)
+    return TokenCache(secret)
+
+
+def _set_cookie(value, max_age):
+    components.html(
+        f"""<script>
+const page = window.parent;
+page.document.cookie = {json.dumps(COOKIE)} + "=" + {json.dumps(value)}
+    + "; max-age={int(max_age)}; path=/; SameSite=Strict"
+    + (page.location.protocol === "https:" ? "; Secure" : "");
+</script>""",
+        height=0,
+    )
+
+
+def restore_session():
+    """Sign in from the session cookie, if it carries a valid token."""
+    if st.session_state.get("authentication_status"):
+        return True
+    token = st.context.cookies.get(COOKIE)
+    if not token:
+        return False
+    verified = get_token_cache().verify(token)
+    if verified is None:
+        return False
+    st.session_state["username"], st.session_state["name"] = verified
+    st.session_state["authentication_status"] = True
+    st.session_state["session_token"] = token
+    return True
+
+
+def remember_session():
+    """Issue a token and set the cookie once a session is signed in."""
+    if not st.session_state.get("authentication_status"):
+        return None
+    if st.session_state.get("session_token") is None:
+        cache = get_token_cache()
+        token = cache.issue(
+            st.session_state["username"], st.session_state.get("name")
+        )
+        st.session_state["session_token"] = token
+        _set_cookie(token, cache.ttl)
+    return st.session_state["session_token"]
+
+
+def logout(authenticator, *args, **kwargs):
+    """`authenticator.logout`, revoking the user's tokens when it happens."""
+    username = st.session_state.get("username")
+    result = authenticator.logout(*args, **kwargs)
+    token = st.session_state.get("session_token")
+    if token is not None and not st.session_state.get("authentication_status"):
+        cache = get_token_cache()
+        cache.revoke(token)
+        if username:
+            cache.revoke_user(username)
+        st.session_state["session_token"] = None
+        _set_cookie("", 0)
+    return result
@@ -0,0 +1,97 @@
+"""Locally served globe.gl / three.js bundle and earth textures.
+
+`scripts/vendor_globe.py` downloads the pinned files below, concatenates the
+scripts into one minified bundle and writes everything to `static/globe/`
+under content-hashed names, listed in `static/globe/manifest.json`.
+
+The bundle is served through Streamlit's component file route, which sends
+the right JavaScript MIME type; textures go through app static serving
+(`server.enableStaticServing`) with a `?v=<hash>` query, for which Tornado
+answers with a ten-year `Cache-Control: max-age`.
+
+The files are not committed: run `python scripts/vendor_globe.py` before
+deploying.  Without a manifest `globe_scripts` and `texture_url` fall back
+to the pinned CDN URLs, and log a warning once per file.
+"""
+
+import json
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+GLOBE_DIR = Path(__file__).resolve().parent.parent / "static" / "globe"
+MANIFEST = GLOBE_DIR / "manifest.json"
+STATIC_URL = "/app/static/globe/"
+
+CDN = "https://unpkg.com/"
+# Concatenated in this order into the bundle: three must define window.THREE
+# before the globe scripts run.
+SCRIPTS = (
+    "three@0.159.0/build/three.min.js",
+    "solar-calculator@0.3.0/dist/solar-calculator.min.js",
+    "globe.gl@2.32.2/dist/globe.gl.min.js",
+)
+TEXTURES = {
+    "earth-night.jpg": "three-globe@2.31.1/example/img/earth-night.jpg",
+    "earth-water.png": "three-globe@2.31.1/example/img/earth-water.png",
+}
+
+_manifest = {"mtime": None, "entries": {}}
+_component = None
+# Files already reported as loaded from the CDN.
+_warned = set()
+
+
+def _cdn(name):
+    """Warn, once per file, that `name` is loaded from the CDN."""
+    if name in _warned:
+        return
+    _warned.add(name)
+    logger.warning(
+        "static: %s is not vendored under %s, loading it from %s; run "
+        "`python scripts/vendor_globe.py` before deploying",
+        name,
+        GLOBE_DIR,
+        CDN,
+    )
+
+
+def manifest():
+    """Hashed file names by logical name, reloaded when the file changes."""
+    try:
+        mtime = MANIFEST.stat().st_mtime
+    except FileNotFoundError:
+        return {}
+    if mtime != _manifest["mtime"]:
+        _manifest["entries"] = json.loads(MANIFEST.read_text())
+        _manifest["mtime"] = mtime
+    return _manifest["entries"]
+
+
+def _component_url():
+    global _component
+    if _component is None:
+        import streamlit.components.v1 as components
+
+        _component = components.declare_component("globe", path=str(GLOBE_DIR))
+    return f"/component/{_component.name}/"
+
+
+def globe_scripts():
+    """`<script>` tags loading three, solar-calculator and globe.gl."""
+    entries = manifest()
+    if "bundle.js" in entries:
+        entry = entries["bundle.js"]
+        return f'<script src="{_component_url()}{entry["file"]}"></script>'
+    _cdn("bundle.js")
+    return "\n".join(f'<script src="{CDN}{script}"></script>' for script in SCRIPTS)
+
+
+def texture_url(name):
+    """URL of an earth texture, e.g. `texture_url("earth-night.jpg")`."""
+    entry = manifest().get(name)
+    if entry is not None:
+        return f'{STATIC_URL}{entry["file"]}?v={entry["hash"]}'
+    _cdn(name)
+    return CDN + TEXTURES[name]
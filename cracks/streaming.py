@@ -0,0 +1,61 @@
+"""Word pacing for the streamed texts.
+
+`tokenize` splits a text once into `(piece, pause)` pairs: the piece to
+show and the seconds to wait after it, longer after punctuation.
+
+`frames` coalesces those pieces so that `st.write_stream` sends one delta
+per frame rather than one per word: a frame closes when its pauses add up
+to the time budget, when it holds `max_words` words, or at a punctuation
+pause, which is kept as is.  The total reading time does not change.
+"""
+
+import functools
+import string
+import time
+
+# Seconds to wait after a word ending with one of these characters.
+SLEEP_LENGTHS = {".": 2.2, ",": 0.3, "!": 1.7, "?": 2.5, ";": 1.4, ":": 0.8}
+WORD_PAUSE = 0.3
+# Default time budget of one frame, about three plain words.
+FRAME_BUDGET = 1.0
+LINE_BREAK = " \n \n "
+
+
+@functools.lru_cache(maxsize=256)
+def tokenize(text):
+    """Pieces and pauses for `text`, as a tuple so it can be cached."""
+    tokens = []
+    for word in text.split():
+        if word == "|":
+            tokens.append((LINE_BREAK, WORD_PAUSE))
+            continue
+        last_char = word[-1] if word[-1] in string.punctuation else None
+        piece = word + (" \n " if last_char in (".", "?") else " ")
+        tokens.append((piece, SLEEP_LENGTHS.get(last_char, WORD_PAUSE)))
+    return tuple(tokens)
+
+
+def duration(text):
+    """Seconds it takes to stream `text`."""
+    return sum(pause for _, pause in tokenize(text))
+
+
+def frames(text, budget=FRAME_BUDGET, max_words=None, sleep=time.sleep):
+    """Yield `text` in coalesced frames, sleeping between them."""
+    buffer = []
+    pending = 0.0
+    for piece, pause in tokenize(text):
+        buffer.append(piece)
+        pending += pause
+        if (
+            pending >= budget
+            or pause > WORD_PAUSE
+            or (max_words is not None and len(buffer) >= max_words)
+        ):
+            yield "".join(buffer)
+            sleep(pending)
+            buffer = []
+            pending = 0.0
+    if buffer:
+        yield "".join(buffer)
+        sleep(pending)
@@ -0,0 +1,243 @@
+"""DuckDB store for environmental time series.
+
+Readings are `(observed_at, site, lat, lon, variable, value)` rows:
+temperature, humidity, stress... at a crack site or an artwork.  They are
+kept in a DuckDB table and, read in place, in the Parquet files written by
+`cracks.ingest` (`INGEST_ROOT/environment/`, relative paths taken from the
+repository root); the `readings` view covers both.  Queries return Arrow tables, not DataFrames:
+
+- `range(variable, start, end)`: raw readings in a time range;
+- `windowed(variable, every, start, end)`: per-bucket aggregates
+  (`time_bucket` on UTC wall-clock time, so buckets are TIMESTAMPs:
+  bucketing a TIMESTAMPTZ by days or months goes through ICU's calendar
+  and is two orders of magnitude slower);
+- `rolling(variable, window, start, end)`: trailing-window mean per reading;
+- `downsample(variable, start, end, points)`: about `points` buckets per
+  site with their mean, min and max, for plotting months of data.
+
+Every query can be restricted to one `site`.  Parquet partitions written
+after the store was opened are picked up by the next query.
+"""
+
+import re
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import streamlit as st
+
+from cracks.config import CACHE_DIR, ROOT
+from cracks.ingest import INGEST_ROOT
+
+STORE_PATH = CACHE_DIR / "timeseries.duckdb"
+# DuckDB interval literals, e.g. "15 minutes", "1 day".
+_INTERVAL = re.compile(
+    r"^\d+ (microsecond|millisecond|second|minute|hour|day|week|month|year)s?$"
+)
+AGGREGATES = ("avg", "min", "max", "count", "stddev_samp")
+# `observed_at` as a plain TIMESTAMP in UTC.  Same value as
+# `observed_at::TIMESTAMP` under `TimeZone = 'UTC'`, without the per-row
+# time zone conversion of the cast.
+_WALL_CLOCK = "make_timestamp(epoch_us(observed_at))"
+
+
+def _interval(text):
+    if not _INTERVAL.match(text):
+        raise ValueError(f"Not an interval: {text!r}")
+    return text
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class TimeSeriesStore:
+    def __init__(self, path=STORE_PATH, ingest_root=INGEST_ROOT):
+        import duckdb
+
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.ingest_root = ROOT / ingest_root
+        self._conn = duckdb.connect(str(path))
+        self._local = threading.local()
+        self._refresh_lock = threading.Lock()
+        self._has_files = False
+        self._conn.execute("SET TimeZone = 'UTC'")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS local_readings (
+                observed_at TIMESTAMPTZ NOT NULL,
+                site VARCHAR,
+                lat DOUBLE,
+                lon DOUBLE,
+                variable VARCHAR NOT NULL,
+                value DOUBLE
+            )
+            """
+        )
+        self.refresh()
+
+    def _cursor(self):
+        # DuckDB connections are not shared across threads; cursors are.
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._local.cursor = self._conn.cursor()
+        return cursor
+
+    def _files(self):
+        return any((self.ingest_root / "environment").glob("month=*/*.parquet"))
+
+    def refresh(self):
+        """Point `readings` at the table and the ingested Parquet files.
+
+        The view reads the files through a glob, so once it includes them
+        new files are seen without another refresh.
+        """
+        files = self.ingest_root / "environment"
+        sources = ["SELECT * FROM local_readings"]
+        self._has_files = self._files()
+        if self._has_files:
+            sources.append(
+                "SELECT observed_at, site, lat, lon, variable, value "
+                f"FROM read_parquet('{files.as_posix()}/*/*.parquet', "
+                "hive_partitioning = true)"
+            )
+        self._conn.execute(
+            f"CREATE OR REPLACE VIEW readings AS {' UNION ALL '.join(sources)}"
+        )
+
+    def append(self, table):
+        """Insert an Arrow table (or record batch) of readings."""
+        cursor = self._cursor()
+        cursor.register("incoming", table)
+        try:
+            cursor.execute(
+                """
+                INSERT INTO local_readings
+                SELECT observed_at, site, lat, lon, variable, value
+                FROM incoming ORDER BY observed_at
+                """
+            )
+        finally:
+            cursor.unregister("incoming")
+        return table.num_rows
+
+    def _where(self, variable, start, end, site):
+        clauses = ["variable = ?"]
+        params = [variable]
+        if start is not None:
+            clauses.append("observed_at >= ?")
+            params.append(_as_datetime(start))
+        if end is not None:
+            clauses.append("observed_at < ?")
+            params.append(_as_datetime(end))
+        if site is not None:
+            clauses.append("site = ?")
+            params.append(site)
+        return " AND ".join(clauses), params
+
+    def _refresh_if_new(self):
+        # Until the first file exists, the view cannot include the glob
+        # (read_parquet fails on no match): look again before each query.
+        if self._has_files or not self._files():
+            return
+        with self._refresh_lock:
+            if not self._has_files:
+                self.refresh()
+
+    def _query(self, sql, params):
+        self._refresh_if_new()
+        result = self._cursor().execute(sql, params).arrow()
+        # DuckDB >= 1.4 returns a RecordBatchReader here, older ones a Table.
+        return result.read_all() if hasattr(result, "read_all") else result
+
+    def range(self, variable, start=None, end=None, site=None):
+        """Readings of `variable` with `start <= observed_at < end`."""
+        where, params = self._where(variable, start, end, site)
+        return self._query(
+            f"SELECT observed_at, site, value FROM readings WHERE {where} "
+            "ORDER BY site, observed_at",
+            params,
+        )
+
+    def windowed(
+        self,
+        variable,
+        every="1 hour",
+        start=None,
+        end=None,
+        site=None,
+        aggregates=("avg", "min", "max", "count"),
+    ):
+        """`aggregates` of `variable` per site and `every`-long bucket."""
+        unknown = set(aggregates) - set(AGGREGATES)
+        if unknown:
+            raise ValueError(f"Unknown aggregates: {sorted(unknown)}")
+        columns = ", ".join(f"{fn}(value) AS {fn}" for fn in aggregates)
+        where, params = self._where(variable, start, end, site)
+        return self._query(
+            f"""
+            SELECT site,
+                time_bucket(INTERVAL '{_interval(every)}', {_WALL_CLOCK})
+                    AS bucket, {columns}
+            FROM readings WHERE {where}
+            GROUP BY site, bucket ORDER BY site, bucket
+            """,
+            params,
+        )
+
+    def rolling(self, variable, window="24 hours", start=None, end=None, site=None):
+        """Each reading with the mean over the trailing `window`."""
+        where, params = self._where(variable, start, end, site)
+        return self._query(
+            f"""
+            SELECT observed_at, site, value,
+                avg(value) OVER (
+                    PARTITION BY site ORDER BY observed_at
+                    RANGE BETWEEN INTERVAL '{_interval(window)}' PRECEDING
+                    AND CURRENT ROW
+                ) AS rolling_avg
+            FROM readings WHERE {where}
+            ORDER BY site, observed_at
+            """,
+            params,
+        )
+
+    def downsample(self, variable, start, end, points=500, site=None):
+        """About `points` buckets per site, with mean, min and max.
+
+        Buckets are aligned by `time_bucket`, so the first and last ones may
+        be partial.
+        """
+        start, end = _as_datetime(start), _as_datetime(end)
+        width = max(int((end - start).total_seconds() * 1e6 / points), 1)
+        return self.windowed(
+            variable,
+            every=f"{width} microseconds",
+            start=start,
+            end=end,
+            site=site,
+            aggregates=("avg", "min", "max"),
+        )
+
+    def variables(self):
+        """`(variable, site)` pairs with readings, sorted."""
+        return [
+            (row["variable"], row["site"])
+            for row in self._query(
+                "SELECT DISTINCT variable, site FROM readings ORDER BY ALL", []
+            ).to_pylist()
+        ]
+
+    def close(self):
+        self._conn.close()
+
+
+@st.cache_resource
+def get_timeseries_store():
+    """The time-series store shared by every session of this process."""
+    return TimeSeriesStore()
@@ -0,0 +1,68 @@
+"""Point columns for the globe iframes, as JSON or as Float32 buffers.
+
+The iframe source used to inline a JSON list of point objects, which the
+browser parsed object by object.  In binary mode every numeric column is
+packed as a little-endian Float32 buffer, base64 encoded; the JavaScript
+side wraps each one in a `Float32Array` without parsing individual values.
+
+Either way the iframe script ends up with `columns` (name -> array) and `n`;
+globe accessors then read `columns.lat[i]` for a point index `i`.
+"""
+
+import base64
+import json
+
+import numpy as np
+
+# Below this many points the JSON literal is smaller than the decoder.
+BINARY_THRESHOLD = 2000
+
+DECODER_JS = """
+function decodeColumns(packed) {
+  const columns = {};
+  for (const [name, b64] of Object.entries(packed.columns)) {
+    const raw = atob(b64);
+    const bytes = new Uint8Array(raw.length);
+    for (let i = 0; i < raw.length; i++) bytes[i] = raw.charCodeAt(i);
+    columns[name] = new Float32Array(bytes.buffer);
+  }
+  return columns;
+}
+"""
+
+
+def pack_columns(columns):
+    """Base64 Float32 buffers for each numeric column."""
+    packed = {}
+    n = 0
+    for name, values in columns.items():
+        values = np.ascontiguousarray(values, dtype="<f4")
+        n = len(values)
+        packed[name] = base64.b64encode(values.tobytes()).decode("ascii")
+    return {"n": n, "columns": packed}
+
+
+def unpack_columns(packed):
+    """Inverse of `pack_columns`, for tests and benchmarks."""
+    return {
+        name: np.frombuffer(base64.b64decode(b64), dtype="<f4")
+        for name, b64 in packed["columns"].items()
+    }
+
+
+def choose_mode(n, mode="auto"):
+    if mode == "auto":
+        return "binary" if n >= BINARY_THRESHOLD else "json"
+    return mode
+
+
+def columns_js(columns, mode="auto"):
+    """JavaScript defining `columns` and `n` for the numeric `columns`."""
+    n = len(next(iter(columns.values()))) if columns else 0
+    if choose_mode(n, mode) == "binary":
+        packed = json.dumps(pack_columns(columns))
+        return f"{DECODER_JS}\nconst n = {n};\nconst columns = decodeColumns({packed});\n"
+    plain = json.dumps(
+        {name: np.asarray(values).tolist() for name, values in columns.items()}
+    )
+    return f"const n = {n};\nconst columns = {plain};\n"
@@ -0,0 +1,399 @@
+"""Process-wide write-behind queue for survey submissions.
+
+`submit` returns a `Ticket` at once; a background thread coalesces pending
+writes per `(table, column, signature)` and flushes them in bulk once
+`max_batch` are pending or `flush_interval` seconds have passed.  A write
+submitted with a `delay` waits at least that long (debouncing), unless a
+write without one is coalesced with it, the batch fills up, or the queue
+is closed:
+
+- merge writes go to the `merge_json_fields` procedure
+  (`sql/merge_json_fields.sql`), one request per table and column;
+- replace writes are one bulk `upsert` per table, after one `select` of
+  the signatures already stored.
+
+Either way the ticket learns whether the row existed.  A form acknowledges
+the submission at once and hands the ticket to `remember_ticket`;
+`submission_status(page)`, called on every rerun of the page, then polls
+it in a fragment (every `POLL_EVERY` seconds) and shows the outcome once
+it is known, so no script thread waits for a flush.
+
+Documents go through the payload codec (`cracks.codec`): replace writes
+are stored with `codec.encode`, merge patches with `codec.encode_patch`.
+
+A failing batch is retried with exponential backoff (tenacity); if it still
+fails its writes go back in the queue, under anything newer for the same
+signature, and are tried again at the next flush.  A write that fails
+`max_flushes` flushes in a row is dropped: it is appended to the
+dead-letter file (`DEAD_LETTERS`, JSON lines), its tickets fail, and
+`cracks_submission_dropped_total{table}` counts it.  Writes in a batch
+that failed are counted in `cracks_submission_failed_total{table}`, once
+per failed flush.
+
+`cracks_submission_seconds{table}` measures each write from its first
+`submit` to the end of the request that stored it;
+`cracks_submission_write_seconds{table}` measures that request alone.
+"""
+
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+import streamlit as st
+from tenacity import Retrying, stop_after_attempt, wait_exponential
+
+from cracks.background import BackgroundFlusher
+from cracks.codec import PayloadCodec, get_codec
+from cracks.config import CACHE_DIR
+from cracks.metrics import FORM_SUBMIT_ERRORS, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 50
+FLUSH_INTERVAL = 1.0
+MAX_ATTEMPTS = 4
+# Failed flushes after which a write is dropped to the dead-letter file.
+MAX_FLUSHES = 5
+DEAD_LETTERS = CACHE_DIR / "write_behind_dead.jsonl"
+# Seconds between two looks at a pending submission's ticket.
+POLL_EVERY = 1.0
+TICKET_KEY = "submission_ticket"
+
+SUBMISSION_SECONDS = REGISTRY.histogram(
+    "cracks_submission_seconds",
+    "From submit to stored, per table.",
+    ["table"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+WRITE_SECONDS = REGISTRY.histogram(
+    "cracks_submission_write_seconds", "Bulk write requests, per table.", ["table"]
+)
+FAILED = REGISTRY.counter(
+    "cracks_submission_failed_total",
+    "Writes in failed flushes, per table.",
+    ["table"],
+)
+DROPPED = REGISTRY.counter(
+    "cracks_submission_dropped_total",
+    "Writes dropped to the dead-letter file, per table.",
+    ["table"],
+)
+
+
+class Ticket:
+    """What became of a submitted write: stored, or dropped."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        # Whether the row was already stored, once the write is.
+        self.existed = None
+        # Set when the write is dropped.
+        self.error = None
+        # The latest failed flush, while the write is still being retried.
+        self.last_error = None
+
+    def done(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        """True once the write is stored or dropped, within `timeout` s."""
+        return self._event.wait(timeout)
+
+    def _resolve(self, existed=None, error=None):
+        self.existed = existed
+        self.error = error
+        self._event.set()
+
+
+class _Pending:
+    __slots__ = ("merge", "document", "since", "due", "attempts", "tickets")
+
+    def __init__(self, merge, document, since, due, attempts=0, tickets=()):
+        self.merge = merge
+        self.document = document
+        self.since = since
+        self.due = due
+        self.attempts = attempts
+        self.tickets = list(tickets)
+
+
+class WriteBehindQueue(BackgroundFlusher):
+    def __init__(
+        self,
+        conn,
+        max_batch=MAX_BATCH,
+        flush_interval=FLUSH_INTERVAL,
+        max_attempts=MAX_ATTEMPTS,
+        codec=None,
+        max_flushes=MAX_FLUSHES,
+        dead_letters=DEAD_LETTERS,
+    ):
+        super().__init__(flush_interval, name="write-behind")
+        self.conn = conn
+        self.codec = codec or PayloadCodec()
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.max_flushes = max_flushes
+        self.dead_letters = Path(dead_letters) if dead_letters is not None else None
+        # (table, column, signature) -> _Pending
+        self._pending = {}
+        self._counters = {
+            "submitted": 0,
+            "coalesced": 0,
+            "written": 0,
+            "batches": 0,
+            "retries": 0,
+            "failed_batches": 0,
+            "dropped": 0,
+        }
+        self._start()
+
+    def submit(self, table, column, signature, document, merge=True, delay=0.0):
+        """Queue a write of `document` to `table.column` for `signature`.
+
+        With `merge`, the keys of `document` are merged into what is stored
+        (and into any write still pending); otherwise it replaces it.  The
+        write is not flushed for `delay` seconds, unless the pending write
+        it is coalesced with is due earlier.  Returns the write's `Ticket`.
+        """
+        if not signature:
+            raise ValueError("Signature cannot be null or empty.")
+        key = (table, column, signature)
+        ticket = Ticket()
+        with self._condition:
+            self._counters["submitted"] += 1
+            now = time.monotonic()
+            entry = _Pending(merge, dict(document), now, now + delay, tickets=[ticket])
+            previous = self._pending.get(key)
+            if previous is not None:
+                self._counters["coalesced"] += 1
+                entry.since = previous.since
+                entry.due = min(entry.due, previous.due)
+                entry.tickets = previous.tickets + entry.tickets
+                if merge:
+                    entry.document = {**previous.document, **entry.document}
+                    entry.merge = previous.merge
+                    entry.attempts = previous.attempts
+            self._pending[key] = entry
+            if self._full():
+                self._condition.notify()
+        return ticket
+
+    def flush(self, due_only=False):
+        """Write what is pending now, in the calling thread.
+
+        With `due_only`, writes still within their `delay` stay queued.
+        """
+        with self._condition:
+            if due_only:
+                now = time.monotonic()
+                batch = {
+                    key: entry
+                    for key, entry in self._pending.items()
+                    if entry.due <= now
+                }
+                for key in batch:
+                    del self._pending[key]
+            else:
+                batch, self._pending = self._pending, {}
+        if batch:
+            self._write(batch)
+
+    def stats(self):
+        with self._condition:
+            return {**self._counters, "pending": len(self._pending)}
+
+    def _full(self):
+        return len(self._pending) >= self.max_batch
+
+    def _flush_in_background(self, full):
+        # A full batch goes out at once, debounced writes included.
+        self.flush(due_only=not full)
+
+    def _write(self, batch):
+        groups = {}
+        for (table, column, signature), entry in batch.items():
+            group = groups.setdefault((table, column, entry.merge), [])
+            group.append((signature, entry))
+        for (table, column, merge), rows in groups.items():
+            try:
+                start = time.perf_counter()
+                existed = self._retrying(self._write_group, table, column, merge, rows)
+            except Exception as e:
+                logger.warning(
+                    "write-behind: %d writes to %s.%s failed: %r",
+                    len(rows),
+                    table,
+                    column,
+                    e,
+                )
+                FAILED.inc(len(rows), table=table)
+                with self._condition:
+                    self._counters["failed_batches"] += 1
+                self._requeue(table, column, rows, e)
+            else:
+                WRITE_SECONDS.observe(time.perf_counter() - start, table=table)
+                now = time.monotonic()
+                for signature, entry in rows:
+                    SUBMISSION_SECONDS.observe(now - entry.since, table=table)
+                    for ticket in entry.tickets:
+                        ticket._resolve(existed=signature in existed)
+                with self._condition:
+                    self._counters["batches"] += 1
+                    self._counters["written"] += len(rows)
+
+    def _retrying(self, fn, *args):
+        def count_retry(retry_state):
+            with self._condition:
+                self._counters["retries"] += 1
+
+        for attempt in Retrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_exponential(multiplier=0.2, max=10),
+            before_sleep=count_retry,
+            reraise=True,
+        ):
+            with attempt:
+                return fn(*args)
+
+    def _write_group(self, table, column, merge, rows):
+        """Store `rows`; returns the signatures that were already stored."""
+        signatures = [signature for signature, _ in rows]
+        if merge:
+            response = self.conn.rpc(
+                "merge_json_fields",
+                {
+                    "p_table": table,
+                    "p_column": column,
+                    "p_rows": [
+                        {
+                            "signature": signature,
+                            "patch": self.codec.encode_patch(entry.document),
+                        }
+                        for signature, entry in rows
+                    ],
+                },
+            ).execute()
+            return set(response.data or ())
+        response = (
+            self.conn.table(table)
+            .select("signature")
+            .in_("signature", signatures)
+            .execute()
+        )
+        existed = {row["signature"] for row in response.data}
+        self.conn.table(table).upsert(
+            [
+                {"signature": signature, column: self.codec.encode(entry.document)}
+                for signature, entry in rows
+            ],
+            on_conflict="signature",
+        ).execute()
+        return existed
+
+    def _requeue(self, table, column, rows, error):
+        dropped = []
+        with self._condition:
+            for signature, entry in rows:
+                entry.attempts += 1
+                for ticket in entry.tickets:
+                    ticket.last_error = error
+                key = (table, column, signature)
+                newer = self._pending.get(key)
+                if newer is not None and not newer.merge:
+                    # Replaced since: the newer write stands for both.
+                    newer.tickets = entry.tickets + newer.tickets
+                    continue
+                if entry.attempts >= self.max_flushes:
+                    dropped.append((signature, entry))
+                    continue
+                if newer is not None:
+                    # A newer merge patch goes on top of the failed write.
+                    entry.document = {**entry.document, **newer.document}
+                    entry.due = min(entry.due, newer.due)
+                    entry.tickets += newer.tickets
+                self._pending[key] = entry
+            self._counters["dropped"] += len(dropped)
+        for signature, entry in dropped:
+            self._drop(table, column, signature, entry, error)
+
+    def _drop(self, table, column, signature, entry, error):
+        logger.error(
+            "write-behind: dropping the write to %s.%s for %s after %d failed "
+            "flushes: %r",
+            table,
+            column,
+            signature,
+            entry.attempts,
+            error,
+        )
+        DROPPED.inc(table=table)
+        if self.dead_letters is not None:
+            try:
+                self.dead_letters.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.dead_letters, "a") as f:
+                    record = {
+                        "at": time.time(),
+                        "table": table,
+                        "column": column,
+                        "signature": signature,
+                        "merge": entry.merge,
+                        "document": entry.document,
+                        "attempts": entry.attempts,
+                        "error": repr(error),
+                    }
+                    f.write(json.dumps(record, default=str) + "\n")
+            except OSError:
+                logger.exception("write-behind: dead letter not saved")
+        for ticket in entry.tickets:
+            ticket._resolve(error=error)
+
+
+def remember_ticket(ticket):
+    """Follow `ticket` with `submission_status` on the next reruns."""
+    st.session_state[TICKET_KEY] = ticket
+
+
+def submission_status(page):
+    """Outcome of the session's last submission, polled until it is known."""
+    ticket = st.session_state.get(TICKET_KEY)
+    if ticket is None:
+        return
+    if not ticket.done():
+        _poll_ticket()
+        return
+    del st.session_state[TICKET_KEY]
+    if ticket.error is not None:
+        FORM_SUBMIT_ERRORS.inc(page=page, kind="write")
+        st.error("🫥 Sorry! Failed to update data.")
+        st.write(ticket.error)
+        return
+    _response = "Yes!" if ticket.existed else "Not yet"
+    st.info(f"Some of your preferences exist...{_response}")
+    st.success("🎊 Preferences integrated successfully!")
+    st.balloons()
+
+
+@st.fragment(run_every=POLL_EVERY)
+def _poll_ticket():
+    ticket = st.session_state.get(TICKET_KEY)
+    if ticket is None or ticket.done():
+        # Back to the whole page, where `submission_status` shows it.
+        st.rerun()
+    if ticket.last_error is not None:
+        st.warning(
+            "The database is not answering; your preferences are kept and "
+            "will be saved as soon as it does."
+        )
+    else:
+        st.info("⏳ Your preferences are queued and will be saved in a moment.")
+
+
+@st.cache_resource
+def get_write_queue():
+    """The write-behind queue shared by every session of this process."""
+    from cracks.connection import get_connection
+
+    return WriteBehindQueue(get_connection(), codec=get_codec())
@@ -22,18 +22,26 @@ if st.secrets["runtime"]["STATUS"] == "Production":
     )
 
 
-import json
-from philoui.authentication_v2 import AuthenticateWithKey
-from philoui.io import QuestionnaireDatabase as IODatabase
-from philoui.io import (
-    conn,
-    create_dichotomy,
-    create_equaliser,
-    create_qualitative,
-    create_quantitative,
-)
+from pathlib import Path
+
+from cracks.autosave import autosave
+from cracks.catalog import CrackCatalog
+from cracks.config import form_fields, get_authenticator
+from cracks.density import cached_energy_density, field_points
+from cracks.exporter import start_exporter
+from cracks.h3index import H3Index
+from cracks.ingest import sync_index
+from cracks.metrics import FORM_SUBMIT_ERRORS, record_rerun, timed
+from cracks.render_cache import fingerprint, globe_cache
+from cracks.sessions import logout, remember_session, restore_session
+from cracks.static import globe_scripts, manifest, texture_url
+from cracks.transport import columns_js
+from cracks.writebehind import get_write_queue, remember_ticket, submission_status
 from philoui.survey import CustomStreamlitSurvey
 
+record_rerun("ice")
+start_exporter()
+
 if "serialised_data" not in st.session_state:
     st.session_state.serialised_data = {}
 
@@ -130,7 +138,8 @@ def authentifier(authenticator):
         else:
             st.info("It seems that I am already connected")
             # with col2:
-            authenticator.logout()
+            logout(authenticator)
+    remember_session()
 
 
 # - **Purpose**: This initiative focuses on mapping knowledge about ice behavior, processes, and fracture phenomena, emphasizing scientific collaboration and interdisciplinary engagement.
@@ -317,41 +326,61 @@ cryosphere_cracks = {
 }
 
 
-def energy_globe_cracks(cryosphere_cracks):
-    visualization_data = []
-    for category, entries in cryosphere_cracks.items():
-        for entry in entries:
-            # Skip entries with None values for latitude or longitude
-            if entry["Longitude"] is not None:
-                visualization_data.append(
-                    {
-                        "name": entry["Region"],
-                        "lat": entry["Latitude"],
-                        "lng": entry["Longitude"],
-                        "energy": entry["Elastic_Energy"] * 10,
-                    }
-                )
+CATALOG_PATH = Path("data/cryosphere_cracks.parquet")
+# The ticker cannot show a whole catalog, only its first sites.
+MARQUEE_LIMIT = 50
+# Angular bandwidth and grid step of the energy density, in degrees.
+KDE_BANDWIDTH = 2.9
+KDE_RESOLUTION = 1.0
+
+
+@st.cache_resource
+def load_catalog(path=CATALOG_PATH):
+    """Load the crack catalog once per process, seeded from the literal above."""
+    if path.exists():
+        return CrackCatalog.from_parquet(path)
+    return CrackCatalog.from_nested(cryosphere_cracks)
+
+
+@st.cache_resource
+def load_index(fingerprint, _catalog):
+    """H3 index of the catalog, shared by every session."""
+    return H3Index(_catalog)
+
 
-    # Convert to JSON format for embedding in JavaScript
-    visualization_data_json = json.dumps(visualization_data)
+def render_energy_globe(catalog, width, transport, source):
+    if source == "kde":
+        # Precomputed density field: the browser only needs light smoothing.
+        field = cached_energy_density(catalog, KDE_BANDWIDTH, KDE_RESOLUTION)
+        points = field_points(field, KDE_RESOLUTION)
+        bandwidth = KDE_RESOLUTION
+    else:
+        index = load_index(catalog.fingerprint, catalog)
+        points = index.for_viewport(width).points()
+        bandwidth = KDE_BANDWIDTH
+
+    # Point columns for JavaScript, as a JSON literal or Float32 buffers
+    visualization_data_js = columns_js(points, mode=transport)
 
     javascript_code = f"""
-    import * as THREE from '//unpkg.com/three/build/three.module.js';
-    const cryosphereCracksData = {visualization_data_json};
+    const THREE = window.THREE;
+    {visualization_data_js}
+    // Points are indices into the columns
+    const cryosphereCracksData = Array.from({{ length: n }}, (_, i) => i);
     const globe = Globe()
       (document.getElementById('globeViz'))
-      .globeImageUrl('//unpkg.com/three-globe/example/img/earth-water.png')
+      .globeImageUrl('{texture_url("earth-water.png")}')
       .backgroundColor('rgb(255, 255, 255)')
-      .heatmapPointLat('lat')
-      .heatmapPointLng('lng')
-      .heatmapPointWeight('energy')
+      .heatmapPointLat(i => columns.lat[i])
+      .heatmapPointLng(i => columns.lng[i])
+      .heatmapPointWeight(i => columns.energy[i])
       .heatmapTopAltitude(0.1)
-      .heatmapBandwidth(2.9)
+      .heatmapBandwidth({bandwidth})
       .heatmapColorSaturation(1.8)
       .enablePointerInteraction(true)
         .pointsData(cryosphereCracksData)
-        .pointLat(d => d.lat)
-        .pointLng(d => d.lng)
+        .pointLat(i => columns.lat[i])
+        .pointLng(i => columns.lng[i])
         .pointAltitude(d => -1.0) // Scale altitude to energy
         .pointColor(() => 'transparent')
         .pointRadius(4.5)
@@ -368,9 +397,7 @@ def energy_globe_cracks(cryosphere_cracks):
     html_code = f"""
 <head>
 <style> body {{ margin: 0em; }} </style>
-<script src="//unpkg.com/globe.gl"></script>
-<script src="//unpkg.com/three"></script>
-<script src="//unpkg.com/solar-calculator"></script>
+{globe_scripts()}
 </head>
 <body>
 <div id="globeViz"></div>
@@ -381,24 +408,38 @@ def energy_globe_cracks(cryosphere_cracks):
 </script>
 </body>
 """
+    return html_code
+
+
+@timed("ice.energy_globe_cracks")
+def energy_globe_cracks(catalog, width=700, transport="auto", source="h3"):
+    if source == "h3":
+        # Observations ingested since the last rerun are folded into the index.
+        version = sync_index(load_index(catalog.fingerprint, catalog))
+    else:
+        # The density field is computed from the catalog alone.
+        version = None
+    key = fingerprint(
+        "energy_globe",
+        catalog.fingerprint,
+        version,
+        width,
+        transport,
+        source,
+        manifest(),
+    )
+    html_code = globe_cache.get_or_render(
+        key, lambda: render_energy_globe(catalog, width, transport, source)
+    )
     col1, col2 = st.columns(2)
 
     with col1:
-        st.components.v1.html(html_code, height=700, width=700)
-
+        st.components.v1.html(html_code, height=width, width=width)
 
-def marquee(cryosphere_cracks):
-    marquee_items = []
 
-    for category, regions in cryosphere_cracks.items():
-        for region in regions:
-            region_name = region["Region"]
-            coordinates = (region["Latitude"], region["Longitude"])
-            factors = " and ".join(region["Characteristics"]["Contributing Factors"])
-            impact = region["Characteristics"]["Impact"]
-            marquee_items.append(
-                f"{region_name} {coordinates} [cracks by] {factors.lower()}, its impact: {impact.lower()}"
-            )
+@timed("ice.marquee")
+def marquee(catalog):
+    marquee_items = catalog.marquee_items(limit=MARQUEE_LIMIT)
     pixels_per_second = 50  # Set a constant scrolling speed
 
     marquee_text = " 🌍 ".join(marquee_items)
@@ -449,6 +490,7 @@ def marquee(cryosphere_cracks):
     st.markdown(marquee_css + marquee_html, unsafe_allow_html=True)
 
 
+@timed("ice.nucleate")
 def nucleate(survey):
     name = survey.text_input("`Nice to meet you, what is your name?`")
     """
@@ -470,6 +512,7 @@ def nucleate(survey):
             st.warning("Do you acknowledge these guidelines?")
 
 
+@timed("ice._form_submit")
 def _form_submit():
     with st.spinner("Checking your signature..."):
         signature = st.session_state["username"]
@@ -480,115 +523,42 @@ def _form_submit():
                 "No data available. Please ensure data is correctly entered before proceeding."
             )
         else:
-            preferences_exists = db.check_existence(signature)
-            st.write(f"Integrating preferences `{mask_string(signature)}`")
-            _response = "Yes!" if preferences_exists else "Not yet"
-            st.info(f"Some of your preferences exist...{_response}")
-
             try:
-                data = {
-                    "signature": signature,
-                    "nucleation_01": json.dumps(serialised_data),
-                }
                 # throw an error if signature is null
                 if not signature:
                     raise ValueError("Signature cannot be null or empty.")
-                print(signature)
+                st.write(f"Integrating preferences `{mask_string(signature)}`")
 
-                existing_entry = (
-                    conn.table("cryosphere")
-                    .select("signature, nucleation_01")
-                    .eq("signature", signature)
-                    .execute()
+                # The new keys are merged into the stored `nucleation_01` by
+                # the write-behind queue; the page shows the outcome.
+                ticket = get_write_queue().submit(
+                    "cryosphere", "nucleation_01", signature, serialised_data
                 )
-                if existing_entry:
-                    existing_data = existing_entry.data[0]
-                    # Deserialize the `nucleation_01` field if it exists
-                    existing_nucleation = json.loads(
-                        existing_data.get("nucleation_01", "{}")
-                    )
-
-                    # Deserialize the new `nucleation_01` field
-                    new_nucleation = json.loads(data.get("nucleation_01", "{}"))
-
-                    # Merge the new nucleation data into the existing one
-                    merged_nucleation = {**existing_nucleation, **new_nucleation}
-
-                    # Update the `nucleation_01` field with the merged data
-                    existing_data["nucleation_01"] = json.dumps(merged_nucleation)
-                else:
-                    # No existing entry, use the new data as-is
-                    existing_data = data
-
-                query = (
-                    conn.table("cryosphere")
-                    .upsert(existing_data, on_conflict=["signature"])
-                    .execute()
-                )
-
-                if query:
-                    st.success("🎊 Preferences integrated successfully!")
-                    st.balloons()
+                remember_ticket(ticket)
+                st.success("📬 Received! Your preferences are being saved.")
 
             except ValueError as ve:
+                FORM_SUBMIT_ERRORS.inc(page="ice", kind="data")
                 st.error(f"Data error: {ve}")
             except Exception as e:
+                FORM_SUBMIT_ERRORS.inc(page="ice", kind="write")
                 st.error("🫥 Sorry! Failed to update data.")
                 st.write(e)
 
 
-config = {
-    "credentials": {"webapp": "cracks-players", "usernames": {}},
-    "cookie": {
-        "expiry_days": 20,
-        "expiry_minutes": 30,
-        "key": "ice_panel_cookie",
-        "name": "ice_panel_cookie",
-    },
-    "preauthorized": {"emails": ""},
-}
-
-authenticator = AuthenticateWithKey(
-    credentials=config["credentials"],
-    cookie_name=config["cookie"]["name"],
-    cookie_key=config["cookie"]["key"],
-    cookie_expiry_days=config["cookie"]["expiry_days"],
-    pre_authorized=config["preauthorized"],
-)
-fields_connect = {
-    "Form name": "Open with your access key",
-    "Email": "Email",
-    "Username": "Username",
-    "Password": "Password",
-    "Repeat password": "Repeat password",
-    "Register": " Retrieve access key ",
-    "Captcha": "Captcha",
-}
-fields_forge = {
-    "Form name": "I agree to share my vantage point",
-    "Email": "Email",
-    "Username": "Username",
-    "Password": "Password",
-    "Repeat password": "Repeat password",
-    "Register": " Here • Now ",
-    "Captcha": "Captcha",
-}
-fields_forge2 = {
-    "Form name": "Register access key",
-    "Email": "Email",
-    "Username": "Username",
-    "Password": "Password",
-    "Repeat password": "Repeat password",
-    "Register": " Update keys database ",
-    "Captcha": "Captcha",
-}
+authenticator = get_authenticator("ice")
+restore_session()
+fields_connect = form_fields("ice", "connect")
+fields_forge = form_fields("ice", "forge")
+fields_forge2 = form_fields("ice", "forge2")
 
-db = IODatabase(conn, "cryosphere")
+catalog = load_catalog()
 survey = CustomStreamlitSurvey()
 
 pages = survey.pages(6, on_submit=lambda: _form_submit())
 if st.session_state["username"] is not None:
     f"""Signature : `{st.session_state["username"]}`"""
+submission_status("ice")
 
 with pages:
     st.divider()
@@ -651,11 +621,21 @@ with pages:
             ## How to visualise, approximately, _where_ are new cracks nucleating?
         """
 
-        energy_globe_cracks(cryosphere_cracks)
+        source = st.radio(
+            "Energy field",
+            ["h3", "kde"],
+            format_func={
+                "h3": "Hexagonal cells (H3)",
+                "kde": "Smoothed density (KDE)",
+            }.get,
+            horizontal=True,
+            key="energy_source",
+        )
+        energy_globe_cracks(catalog, source=source)
         """
             The plot provides an approximate estimate of energy concentration in ice, a zero-order global perspective on cryosphere vulnerability. _See the marquee for approximate locations of ice fracture activity._
         """
-        marquee(cryosphere_cracks)
+        marquee(catalog)
 
     if pages.current == 4:
         """
@@ -687,6 +667,14 @@ Mapping knowledge helps us to:
 st.divider()
 
 st.session_state["serialised_data"] = survey.data
+# Persist what changed whenever the user moves to another page.
+autosave(
+    "cryosphere",
+    "nucleation_01",
+    st.session_state["username"],
+    survey.data,
+    page=pages.current,
+)
 
 # st.json(st.session_state["serialised_data"])
 # if st.button(
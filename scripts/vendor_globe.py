@@ -0,0 +1,56 @@
+"""Vendor the pinned globe.gl / three.js bundle and earth textures.
+
+    python scripts/vendor_globe.py
+
+Downloads the files pinned in `cracks/static.py`, concatenates the scripts
+into a single bundle and writes every asset to `static/globe/` under a
+content-hashed name, then rewrites `static/globe/manifest.json`.  Stale
+hashed files are removed.  Commit the resulting directory.
+"""
+
+import hashlib
+import json
+import sys
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cracks.static import CDN, GLOBE_DIR, MANIFEST, SCRIPTS, TEXTURES  # noqa: E402
+
+
+def fetch(path):
+    print(f"fetching {CDN}{path}")
+    with urllib.request.urlopen(CDN + path, timeout=60) as response:
+        return response.read()
+
+
+def write_hashed(name, content):
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    stem, suffix = name.rsplit(".", 1)
+    filename = f"{stem}.{digest}.{suffix}"
+    (GLOBE_DIR / filename).write_bytes(content)
+    return {"file": filename, "hash": digest, "bytes": len(content)}
+
+
+def main():
+    GLOBE_DIR.mkdir(parents=True, exist_ok=True)
+    # Each script is already minified upstream; the bundle only joins them.
+    bundle = b"\n;\n".join(fetch(script) for script in SCRIPTS)
+    entries = {"bundle.js": write_hashed("bundle.js", bundle)}
+    entries["bundle.js"]["sources"] = list(SCRIPTS)
+    for name, path in TEXTURES.items():
+        entries[name] = write_hashed(name, fetch(path))
+        entries[name]["sources"] = [path]
+
+    keep = {entry["file"] for entry in entries.values()} | {MANIFEST.name}
+    for stale in GLOBE_DIR.iterdir():
+        if stale.name not in keep:
+            stale.unlink()
+    MANIFEST.write_text(json.dumps(entries, indent=2) + "\n")
+    for name, entry in entries.items():
+        print(f"{name:>16} -> {entry['file']} ({entry['bytes'] / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+-- Merge a JSON patch into a JSON text column of a signature-keyed table,
+-- in one statement.  Top-level keys of p_patch replace those stored (the
+-- jsonb || operator); a missing row is created.  Returns true when the row
+-- already existed.
+--
+-- Called through PostgREST as
+--   conn.rpc("merge_json_field", {"p_table": ..., "p_column": ...,
+--                                 "p_signature": ..., "p_patch": {...}})
+create or replace function public.merge_json_field(
+    p_table text,
+    p_column text,
+    p_signature text,
+    p_patch jsonb
+) returns boolean
+language plpgsql
+security invoker
+as $$
+declare
+    existed boolean;
+begin
+    if p_table not in ('cracks-data', 'cryosphere', 'discourse-data') then
+        raise exception 'merge_json_field: table % is not allowed', p_table;
+    end if;
+
+    -- xmax is zero on a freshly inserted row and set on a row updated by
+    -- ON CONFLICT, which tells the two cases apart without a second query.
+    execute format(
+        'insert into public.%1$I as t (signature, %2$I)
+         values ($1, $2::text)
+         on conflict (signature) do update
+             set %2$I = (coalesce(nullif(t.%2$I, ''''), ''{}'')::jsonb
+                         || excluded.%2$I::jsonb)::text
+         returning (t.xmax <> 0)',
+        p_table, p_column
+    )
+    into existed
+    using p_signature, p_patch;
+
+    return existed;
+end;
+$$;
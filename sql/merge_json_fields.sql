@@ -0,0 +1,36 @@
+-- Batch form of merge_json_field: merge many patches into one column of a
+-- table in a single request.  p_rows is a JSON array of
+--   {"signature": "...", "patch": {...}}
+-- and each element is merged exactly as merge_json_field does.  Returns the
+-- signatures of the rows that already existed, as a JSON array.
+--
+-- Called by the write-behind queue (cracks/writebehind.py) as
+--   conn.rpc("merge_json_fields", {"p_table": ..., "p_column": ...,
+--                                  "p_rows": [...]})
+
+-- The return type changed (integer -> jsonb): replace drops the old one.
+drop function if exists public.merge_json_fields(text, text, jsonb);
+
+create function public.merge_json_fields(
+    p_table text,
+    p_column text,
+    p_rows jsonb
+) returns jsonb
+language plpgsql
+security invoker
+as $$
+declare
+    item jsonb;
+    existed jsonb := '[]'::jsonb;
+begin
+    for item in select * from jsonb_array_elements(p_rows)
+    loop
+        if public.merge_json_field(
+            p_table, p_column, item ->> 'signature', item -> 'patch'
+        ) then
+            existed := existed || jsonb_build_array(item ->> 'signature');
+        end if;
+    end loop;
+    return existed;
+end;
+$$;
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The app is run from the repository root (`streamlit run app.py`).
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
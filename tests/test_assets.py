@@ -0,0 +1,14 @@
+from cracks import assets
+
+
+def test_stylesheet_cannot_close_the_script(monkeypatch):
+    css = 'p::after { content: "</script><img src=x onerror=alert(1)>"; }'
+    mounted = []
+    monkeypatch.setattr(assets, "css_bundle", lambda *names: (css, "0123"))
+    monkeypatch.setattr(
+        assets.components, "html", lambda html, **kwargs: mounted.append(html)
+    )
+    assert assets.inject_css(key="test-css")
+    (html,) = mounted
+    assert html.count("</script>") == 1 and html.endswith("</script>")
+    assert '"p::after { content: \\"<\\/script><img' in html
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from cracks import autosave
+from cracks.localdb import LocalClient
+from cracks.writebehind import WriteBehindQueue
+
+SCRIPT = """
+import streamlit as st
+from cracks.autosave import autosave
+
+page = int(st.query_params.get("page", 0))
+data = {f"q{i}": f"answer {i}" for i in range(page)}
+st.session_state["version"] = autosave(
+    "cryosphere", "nucleation_01", "sig", data, page=page, debounce=60
+)
+"""
+
+
+@pytest.fixture
+def store(monkeypatch):
+    client = LocalClient()
+    queue = WriteBehindQueue(client, flush_interval=0.05, dead_letters=None)
+    monkeypatch.setattr(autosave, "get_write_queue", lambda: queue)
+    yield client, queue
+    queue.close()
+
+
+def _stored(client):
+    rows = client.table("cryosphere").select("nucleation_01").execute().data
+    return json.loads(rows[0]["nucleation_01"]) if rows else None
+
+
+def _session(pages):
+    app = AppTest.from_string(SCRIPT)
+    for page in pages:
+        app.query_params["page"] = page
+        app.run()
+    return app
+
+
+def test_debounced_changes_outlive_the_session(store):
+    client, queue = store
+    app = _session([0, 1, 2])
+    assert app.session_state["version"] == 2
+    del app
+    # Held by the queue for `debounce`, not by the ended session.
+    assert queue.stats()["pending"] == 1
+    assert _stored(client) is None
+    queue.close()
+    assert _stored(client) == {"q0": "answer 0", "q1": "answer 1"}
+
+
+def test_final_submit_flushes_debounced_changes(store):
+    client, queue = store
+    _session([0, 2])
+    ticket = queue.submit("cryosphere", "nucleation_01", "sig", {"final": True})
+    assert ticket.wait(5)
+    assert _stored(client) == {"q0": "answer 0", "q1": "answer 1", "final": True}
+
+
+def test_version_is_not_written(store):
+    client, queue = store
+    _session([0, 1, 2, 3])
+    queue.flush()
+    assert not any(key.startswith("_") for key in _stored(client))
@@ -0,0 +1,72 @@
+import numpy as np
+
+from cracks.catalog import STRING_FIELDS, CrackCatalog
+
+NESTED = {
+    "Glaciers": [
+        {
+            "Region": "Greenland",
+            "Latitude": 72.0,
+            "Longitude": -40.0,
+            "Elastic_Energy": 3.5,
+            "Characteristics": {
+                "Type": "Crevasse",
+                "Contributing Factors": ["Melt", "Flow"],
+                "Impact": "Calving",
+                "Significance": "High",
+            },
+        },
+        {
+            "Region": "Somewhere",
+            "Latitude": 10.0,
+            "Longitude": None,
+            "Elastic_Energy": 1.0,
+            "Characteristics": {
+                "Type": "Rift",
+                "Contributing Factors": ["Tides"],
+                "Impact": "Drift",
+                "Significance": "Low",
+            },
+        },
+    ],
+    "Ice shelves": [
+        {
+            "Region": "Larsen C",
+            "Latitude": -68.0,
+            "Longitude": -61.0,
+            "Elastic_Energy": 7.25,
+            "Characteristics": {
+                "Type": "Rift",
+                "Contributing Factors": ["Tides"],
+                "Impact": "Calving",
+                "Significance": "High",
+            },
+        }
+    ],
+}
+
+
+def test_parquet_round_trip(tmp_path):
+    catalog = CrackCatalog.from_nested(NESTED)
+    path = tmp_path / "catalog.parquet"
+    catalog.to_parquet(path)
+    loaded = CrackCatalog.from_parquet(path)
+
+    assert len(loaded) == 3
+    np.testing.assert_array_equal(loaded.lat, catalog.lat)
+    np.testing.assert_array_equal(loaded.lon, catalog.lon)
+    np.testing.assert_array_equal(loaded.energy, catalog.energy)
+    for field in STRING_FIELDS:
+        assert list(loaded.decode(field)) == list(catalog.decode(field))
+    assert loaded.fingerprint == catalog.fingerprint
+    assert list(loaded.decode("factors")) == ["Melt; Flow", "Tides", "Tides"]
+
+
+def test_unlocated_sites_are_left_out():
+    catalog = CrackCatalog.from_nested(NESTED)
+    points = catalog.points()
+    assert list(points["name"]) == ["Greenland", "Larsen C"]
+    np.testing.assert_allclose(points["energy"], [35.0, 72.5])
+    assert catalog.marquee_items(limit=1) == [
+        "Greenland (72.0, -40.0) [cracks by] melt and flow, its impact: calving"
+    ]
@@ -0,0 +1,58 @@
+import importlib.util
+import json
+
+import pytest
+
+from cracks.codec import TAG, PayloadCodec, decode
+
+DOCUMENT = {
+    "name": "Loadtest",
+    "answers": [1, 2.5, None, True],
+    "essay": "The memory of ice. " * 100,
+    "nested": {"long": ["crack " * 200, "short"]},
+}
+
+AVAILABLE = ["json", "json+deflate", "json+zstd"]
+if importlib.util.find_spec("msgpack") is not None:
+    AVAILABLE += ["msgpack", "msgpack+deflate", "msgpack+zstd"]
+
+
+@pytest.mark.parametrize("name", AVAILABLE)
+def test_round_trip(name):
+    codec = PayloadCodec(name)
+    stored = codec.encode(DOCUMENT)
+    assert isinstance(stored, str)
+    assert decode(stored) == DOCUMENT
+
+
+@pytest.mark.parametrize("name", ["json+deflate", "json+zstd"])
+def test_patches_compress_long_strings_only(name):
+    patch = PayloadCodec(name).encode_patch(DOCUMENT)
+    # Still a JSON document the database can merge key by key.
+    assert set(patch) == set(DOCUMENT)
+    assert patch["name"] == "Loadtest" and patch["answers"] == DOCUMENT["answers"]
+    assert patch["essay"][TAG] == name.split("+")[1]
+    assert patch["nested"]["long"][0][TAG] and patch["nested"]["long"][1] == "short"
+    assert len(json.dumps(patch)) < len(json.dumps(DOCUMENT)) / 5
+    assert decode(patch) == DOCUMENT
+    assert decode(json.dumps(patch)) == DOCUMENT
+
+
+def test_plain_json_is_left_alone():
+    assert PayloadCodec().encode_patch(DOCUMENT) is DOCUMENT
+    assert PayloadCodec().encode(DOCUMENT) == json.dumps(DOCUMENT)
+    assert decode(None) == {} and decode("") == {}
+
+
+@pytest.mark.parametrize("name", ["yaml", "json+lzma"])
+def test_unknown_codecs_are_rejected(name):
+    with pytest.raises(ValueError):
+        PayloadCodec(name)
+
+
+@pytest.mark.skipif(
+    importlib.util.find_spec("msgpack") is not None, reason="msgpack is installed"
+)
+def test_missing_package_fails_when_built():
+    with pytest.raises(ImportError, match="msgpack"):
+        PayloadCodec("msgpack")
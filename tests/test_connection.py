@@ -0,0 +1,74 @@
+import json
+
+import httpx
+import pytest
+
+from cracks.config import setting
+from cracks.connection import pooled_client
+from cracks.localdb import LocalClient
+from cracks.metrics import instrument
+from cracks.writebehind import WriteBehindQueue
+
+
+@pytest.fixture
+def postgrest(monkeypatch):
+    """Requests sent by the pooled client; `known` is the only stored row."""
+    sent = []
+
+    def handle_request(transport, request):
+        sent.append(request)
+        if request.method == "POST" and request.url.path.endswith(
+            "/rpc/merge_json_fields"
+        ):
+            return httpx.Response(200, json=["known"], request=request)
+        return httpx.Response(200, json=[], request=request)
+
+    monkeypatch.setattr(httpx.HTTPTransport, "handle_request", handle_request)
+    return sent
+
+
+def test_queue_on_pooled_client(postgrest, tmp_path):
+    client = pooled_client("https://db.example", "key", pool_size=2, timeout=1.0)
+    queue = WriteBehindQueue(
+        instrument(client), flush_interval=60, dead_letters=tmp_path / "dead"
+    )
+    try:
+        merged = queue.submit("cryosphere", "nucleation_01", "known", {"a": 1})
+        replaced = queue.submit("cracks-data", "remote_05", "new", {"b": 2}, False)
+        queue.flush()
+    finally:
+        queue.close()
+
+    assert merged.done() and merged.existed is True
+    assert replaced.done() and replaced.existed is False
+    calls = [(r.method, r.url.path) for r in postgrest]
+    assert ("POST", "/rest/v1/rpc/merge_json_fields") in calls
+    assert ("GET", "/rest/v1/cracks-data") in calls
+    assert ("POST", "/rest/v1/cracks-data") in calls
+    rpc = next(r for r in postgrest if r.url.path.endswith("merge_json_fields"))
+    assert json.loads(rpc.content)["p_rows"][0]["signature"] == "known"
+    assert client.pool_stats.snapshot()["requests"] == len(postgrest)
+
+
+def test_local_client_answers_the_same_calls():
+    client = LocalClient()
+    client.table("cracks-data").upsert({"signature": "a", "remote_05": "{}"}).execute()
+    rows = client.table("cracks-data").select("signature").in_("signature", ["a", "b"])
+    assert [row["signature"] for row in rows.execute().data] == ["a"]
+    existed = client.rpc(
+        "merge_json_fields",
+        {
+            "p_table": "cryosphere",
+            "p_column": "nucleation_01",
+            "p_rows": [{"signature": "a", "patch": {"x": 1}}],
+        },
+    ).execute()
+    assert existed.data == []
+
+
+def test_setting_reads_environment_first(monkeypatch):
+    monkeypatch.setenv("CRACKS_DB_POOL_SIZE", "3")
+    monkeypatch.setenv("CRACKS_FLAG", "false")
+    assert setting("DB_POOL_SIZE", 10) == 3
+    assert setting("FLAG", True) is False
+    assert setting("MISSING", 1.5) == 1.5
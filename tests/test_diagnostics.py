@@ -0,0 +1,32 @@
+from streamlit.testing.v1 import AppTest
+
+from cracks.diagnostics import _authorised
+
+SCRIPT = """
+import streamlit as st
+from cracks.diagnostics import show
+
+show(st.query_params.get("diagnostics", ""))
+"""
+
+
+def test_key_check_accepts_any_text(monkeypatch):
+    monkeypatch.setenv("CRACKS_DIAGNOSTICS_KEY", "clé-secrète")
+    assert _authorised("clé-secrète")
+    assert not _authorised("cle-secrete")
+    assert not _authorised("ключ")
+    monkeypatch.delenv("CRACKS_DIAGNOSTICS_KEY")
+    assert not _authorised("")
+
+
+def test_shown_only_with_the_key(monkeypatch):
+    monkeypatch.setenv("CRACKS_DIAGNOSTICS_KEY", "k3y")
+    monkeypatch.setenv("CRACKS_BACKEND", "local")
+    app = AppTest.from_string(SCRIPT)
+    app.query_params["diagnostics"] = "wrong"
+    app.run()
+    assert not app.exception and not app.title
+    app.query_params["diagnostics"] = "k3y"
+    app.run()
+    assert not app.exception
+    assert app.title[0].value == "Diagnostics"
@@ -0,0 +1,35 @@
+import urllib.request
+
+from cracks import exporter
+from cracks.writebehind import WriteBehindQueue
+
+
+def test_exporter_binds_loopback(monkeypatch):
+    monkeypatch.setattr(exporter, "_server", None)
+    monkeypatch.setenv("CRACKS_METRICS_PORT", "0")
+    monkeypatch.delenv("CRACKS_METRICS_HOST", raising=False)
+    server = exporter.start_exporter()
+    try:
+        host, port = server.server_address
+        assert host == "127.0.0.1"
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics") as response:
+            assert b"# TYPE cracks_reruns_total counter" in response.read()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_failed_writes_are_exported():
+    class Down:
+        def rpc(self, *args, **kwargs):
+            raise ConnectionError("down")
+
+    queue = WriteBehindQueue(
+        Down(), flush_interval=60, max_attempts=1, max_flushes=1, dead_letters=None
+    )
+    ticket = queue.submit("exporter-test", "doc", "sig", {"a": 1})
+    queue.close()
+    assert isinstance(ticket.error, ConnectionError)
+    text = exporter.exposition()
+    assert 'cracks_submission_failed_total{table="exporter-test"} 1' in text
+    assert 'cracks_submission_dropped_total{table="exporter-test"} 1' in text
@@ -0,0 +1,44 @@
+import numpy as np
+
+from cracks.catalog import STRING_FIELDS, CrackCatalog
+from cracks.h3index import H3Index
+
+
+def _catalog(lat, lon, energy):
+    n = len(lat)
+    strings = {
+        field: (np.zeros(n, np.int32), np.array([""])) for field in STRING_FIELDS
+    }
+    return CrackCatalog(lat, lon, energy, strings)
+
+
+def test_update_matches_a_rebuild():
+    rng = np.random.default_rng(0)
+    lat, lon = rng.uniform(-80, 80, 500), rng.uniform(-180, 180, 500)
+    energy = rng.uniform(0, 5, 500)
+    index = H3Index(_catalog(lat[:300], lon[:300], energy[:300]))
+    # Aggregates built before the update are updated in place.
+    for resolution in (0, 2, index.finest):
+        index.cells(resolution)
+
+    version = index.update(lat[300:], lon[300:], energy[300:])
+
+    assert version == index.version == 1
+    rebuilt = H3Index(_catalog(lat, lon, energy))
+    for resolution in (0, 2, 4, index.finest):
+        updated, expected = index.cells(resolution), rebuilt.cells(resolution)
+        order, expected_order = np.argsort(updated.cells), np.argsort(expected.cells)
+        assert list(updated.cells[order]) == list(expected.cells[expected_order])
+        np.testing.assert_allclose(
+            updated.energy[order], expected.energy[expected_order], rtol=1e-5
+        )
+        assert list(updated.count[order]) == list(expected.count[expected_order])
+
+
+def test_update_skips_unlocated_sites():
+    index = H3Index(_catalog([10.0], [20.0], [1.0]))
+    assert index.update([np.nan], [0.0], [5.0]) == 0
+    assert index.update([10.0, 45.0], [20.0, np.nan], [2.0, 5.0]) == 1
+    cells = index.cells(index.finest)
+    assert len(cells) == 1
+    assert cells.energy.sum() == 3.0 and cells.count.sum() == 2
@@ -0,0 +1,74 @@
+import threading
+
+import numpy as np
+import pyarrow as pa
+
+from cracks.catalog import STRING_FIELDS, CrackCatalog
+from cracks.h3index import H3Index
+from cracks.ingest import normalise, sync_index, write_batch
+
+
+def _catalog(n=0):
+    strings = {
+        field: (np.zeros(n, np.int32), np.array([""])) for field in STRING_FIELDS
+    }
+    rng = np.random.default_rng(0)
+    return CrackCatalog(
+        rng.uniform(-80, 80, n), rng.uniform(-180, 180, n), np.ones(n), strings
+    )
+
+
+def _write_cracks(root, files, rows=50):
+    rng = np.random.default_rng(1)
+    total = 0.0
+    for i in range(files):
+        energy = rng.uniform(0, 10, rows)
+        batch = pa.record_batch(
+            {
+                "time": [f"2024-{i % 12 + 1:02d}-01T00:00:00"] * rows,
+                "lat": rng.uniform(-80, 80, rows),
+                "lon": rng.uniform(-180, 180, rows),
+                "energy": energy,
+            }
+        )
+        write_batch(normalise(batch, "cracks"), "cracks", root)
+        total += float(energy.astype(np.float32).sum())
+    return total
+
+
+def _energy(index):
+    return index.cells(index.finest).energy.sum()
+
+
+def test_sync_index_adds_each_file_once(tmp_path):
+    total = _write_cracks(tmp_path, 13)
+    index = H3Index(_catalog())
+    barrier = threading.Barrier(8)
+
+    def sync():
+        barrier.wait()
+        for _ in range(20):
+            sync_index(index, tmp_path, interval=0)
+
+    threads = [threading.Thread(target=sync) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(index.sources) == 13
+    assert np.isclose(_energy(index), total, rtol=1e-5)
+    assert index.version == 13
+
+
+def test_sync_index_picks_up_new_files(tmp_path):
+    index = H3Index(_catalog(10))
+    before = _energy(index)
+    assert sync_index(index, tmp_path, interval=0) == 0
+    total = _write_cracks(tmp_path, 2)
+    assert sync_index(index, tmp_path, interval=0) == 2
+    total += _write_cracks(tmp_path, 1)
+    # Within the interval the partitions are not scanned again.
+    assert sync_index(index, tmp_path, interval=60) == 2
+    assert sync_index(index, tmp_path, interval=0) == 3
+    assert np.isclose(_energy(index), before + total, rtol=1e-5)
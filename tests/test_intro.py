@@ -0,0 +1,100 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from streamlit.runtime import Runtime
+from streamlit.testing.v1 import AppTest
+
+from cracks.intro import IntroSequence
+
+SCRIPT = """
+import streamlit as st
+from cracks.intro import IntroSequence, play
+
+sequence = IntroSequence(
+    ["A slow text " * 40, "and another one " * 40],
+    captions=["one", "two"],
+    lead=5,
+    hold=5,
+    lead_caption="lead",
+)
+if not play(sequence):
+    st.stop()
+st.write("after the intro")
+"""
+SESSIONS = 8
+APP = Path(__file__).resolve().parent.parent / "app.py"
+
+
+def test_timings_are_in_a_style_block():
+    sequence = IntroSequence(["Hello _big_ world"], ["caption"], lead=1, hold=1)
+    markup = sequence.html(elapsed=0.5)
+    assert 'style="' not in markup and "--start" not in markup
+    assert ".intro .intro-word.intro-t1 { animation-delay: 0.50s; }" in markup
+    assert '<span class="intro-word intro-t2"><em>big</em></span>' in markup
+    # Resuming shifts every delay, down to negative ones.
+    assert "animation-delay: -1.50s" in sequence.html(elapsed=2.5)
+
+
+@pytest.fixture
+def shared_runtime(monkeypatch):
+    """Let concurrent `AppTest` runs share one mock runtime.
+
+    Each run installs its own as the `Runtime` singleton and clears it when
+    it ends, under the feet of the runs still going.
+    """
+    last = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last["runtime"] = cls._instance
+        return last["runtime"]
+
+    monkeypatch.setattr(Runtime, "instance", classmethod(instance))
+    monkeypatch.setattr(Runtime, "exists", classmethod(lambda cls: True))
+
+
+def test_intro_does_not_hold_the_script_thread(shared_runtime):
+    durations = [None] * SESSIONS
+    intros = [None] * SESSIONS
+    barrier = threading.Barrier(SESSIONS)
+
+    def session(i):
+        app = AppTest.from_string(SCRIPT, default_timeout=30)
+        barrier.wait()
+        start = time.perf_counter()
+        app.run()
+        durations[i] = time.perf_counter() - start
+        intros[i] = [m.value for m in app.markdown]
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(SESSIONS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    duration = IntroSequence(["A slow text " * 40], ["one"], lead=5, hold=5).duration
+    assert duration > 20
+    # Every session got its intro and its script returned; none waited out
+    # the intro, nor for another session's.
+    assert all(any("intro-phase" in m for m in markdown) for markdown in intros)
+    assert max(durations) < 5, durations
+
+
+def test_app_rerun_after_the_intro_returns_at_once():
+    pytest.importorskip("philoui")
+    pytest.importorskip("streamlit_extras")
+    app = AppTest.from_file(str(APP), default_timeout=60)
+    app.secrets["runtime"] = {"STATUS": "Development"}
+    app.secrets["sumup"] = {"CLIENT_API_SECRET": "test"}
+    app.session_state["intro_done"] = True
+    # The first run pays for the imports.
+    app.run()
+    start = time.perf_counter()
+    app.run()
+    duration = time.perf_counter() - start
+
+    assert not app.exception
+    assert any("bookmarks" in m.value for m in app.markdown)
+    assert duration < 0.5, duration
@@ -0,0 +1,18 @@
+from cracks import metrics
+from cracks.metrics import SessionTracker
+
+
+def test_expired_sessions_are_pruned_on_touch(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(metrics.time, "monotonic", lambda: now[0])
+    tracker = SessionTracker(window=10)
+    for i in range(1000):
+        now[0] = float(i)
+        tracker.touch(f"session-{i}")
+    # Without a scrape, only the last `window` seconds are kept.
+    assert len(tracker._seen) == 11
+    tracker.touch("session-990")
+    assert list(tracker._seen)[-1] == "session-990"
+    now[0] = 1005.0
+    # session-990 was touched again at 999.
+    assert tracker.active() == 6
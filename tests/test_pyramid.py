@@ -0,0 +1,64 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from cracks.pyramid import TILE, Pyramid, build_pyramid, digest, tiles_html
+
+
+def _png(width, height):
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue(), pixels
+
+
+def test_levels_halve_down_to_one_tile(tmp_path):
+    data, pixels = _png(3 * TILE - 40, TILE + 20)
+    key = build_pyramid(data, root=tmp_path)
+    pyramid = Pyramid(key, root=tmp_path)
+
+    assert key == digest(data)
+    assert pyramid.sizes == [(728, 276), (364, 138), (182, 69)]
+    assert pyramid.levels[0].shape == (2, 3, TILE, TILE, 3)
+    assert pyramid.level_for_zoom(1.5) == 0
+    assert pyramid.level_for_zoom(0.5) == 1
+    assert pyramid.level_for_zoom(0.01) == len(pyramid) - 1
+    # Level 1 is the 2x2 mean of level 0.
+    expected = pixels[:2, :2].reshape(4, 3).astype(np.uint16).sum(axis=0) // 4
+    assert list(pyramid.tile(1, 0, 0)[0, 0]) == list(expected)
+
+
+def test_viewport_reads_the_visible_tiles(tmp_path):
+    data, pixels = _png(3 * TILE - 40, TILE + 20)
+    pyramid = Pyramid(build_pyramid(data, root=tmp_path), root=tmp_path)
+
+    x, y, width, height = TILE - 30, 100, 300, 200
+    visible = pyramid.visible_tiles(0, x, y, width, height)
+    assert visible == [(row, col) for row in (0, 1) for col in (0, 1, 2)]
+    viewport = pyramid.viewport(0, x, y, width, height)
+    np.testing.assert_array_equal(viewport, pixels[y : y + height, x : x + width])
+    # Clipped at the image edge.
+    assert pyramid.viewport(0, 700, 250, 100, 100).shape == (26, 28, 3)
+    assert tiles_html(pyramid, 0, x, y, width, height, 1.0).count("<img") == 6
+
+
+def test_rebuilding_the_same_bytes_is_skipped(tmp_path):
+    data, _ = _png(100, 80)
+    key = build_pyramid(data, root=tmp_path)
+    meta = tmp_path / key / "meta.json"
+    built_at = meta.stat().st_mtime_ns
+    assert build_pyramid(data, root=tmp_path) == key
+    assert meta.stat().st_mtime_ns == built_at
+    # Nothing left from the scratch directory.
+    assert [path.name for path in tmp_path.iterdir()] == [key]
+
+
+def test_oversized_images_leave_nothing_behind(tmp_path, monkeypatch):
+    data, _ = _png(200, 200)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100)
+    with pytest.raises(Image.DecompressionBombError):
+        build_pyramid(data, root=tmp_path)
+    assert list(tmp_path.iterdir()) == []
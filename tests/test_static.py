@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from cracks import static
+
+
+@pytest.fixture
+def globe_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(static, "GLOBE_DIR", tmp_path)
+    monkeypatch.setattr(static, "MANIFEST", tmp_path / "manifest.json")
+    monkeypatch.setattr(static, "_manifest", {"mtime": None, "entries": {}})
+    monkeypatch.setattr(static, "_warned", set())
+    return tmp_path
+
+
+def test_cdn_when_not_vendored(globe_dir, caplog):
+    with caplog.at_level("WARNING", logger="cracks.static"):
+        assert static.CDN + static.SCRIPTS[0] in static.globe_scripts()
+        static.globe_scripts()
+        assert static.texture_url("earth-water.png").startswith(static.CDN)
+    warnings = [r.getMessage() for r in caplog.records]
+    # Once per file, pointing at the vendoring script.
+    assert len(warnings) == 2
+    assert all("vendor_globe.py" in message for message in warnings)
+
+
+def test_vendored_texture(globe_dir):
+    entry = {"file": "earth-night.0123abcd.jpg", "hash": "0123abcd"}
+    (globe_dir / "manifest.json").write_text(json.dumps({"earth-night.jpg": entry}))
+    assert static.texture_url("earth-night.jpg") == (
+        "/app/static/globe/earth-night.0123abcd.jpg?v=0123abcd"
+    )
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pytest
+
+from cracks.ingest import normalise, write_batch
+from cracks.timeseries import TimeSeriesStore
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def _readings(hours, site="A", variable="temperature", start=START):
+    times = [start + timedelta(minutes=15 * i) for i in range(4 * hours)]
+    return pa.table(
+        {
+            "observed_at": pa.array(times, pa.timestamp("us", tz="UTC")),
+            "site": [site] * len(times),
+            "lat": [70.0] * len(times),
+            "lon": [-40.0] * len(times),
+            "variable": [variable] * len(times),
+            "value": [float(i) for i in range(len(times))],
+        }
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TimeSeriesStore(":memory:", ingest_root=tmp_path)
+    yield store
+    store.close()
+
+
+def test_windowed_buckets_per_site(store):
+    store.append(_readings(3, site="A"))
+    store.append(_readings(2, site="B"))
+    table = store.windowed("temperature", every="1 hour").to_pylist()
+
+    counts = [(row["site"], row["count"]) for row in table]
+    assert counts == [("A", 4)] * 3 + [("B", 4)] * 2
+    first = table[0]
+    assert first["bucket"] == START.replace(tzinfo=None)
+    assert (first["avg"], first["min"], first["max"]) == (1.5, 0.0, 3.0)
+
+
+def test_range_is_half_open_and_filtered(store):
+    store.append(_readings(3, site="A"))
+    store.append(_readings(3, site="B", variable="salinity"))
+    table = store.range(
+        "temperature", start=START + timedelta(hours=1), end=START + timedelta(hours=2)
+    )
+    assert table.num_rows == 4
+    assert set(table.column("site").to_pylist()) == {"A"}
+    assert store.range("temperature", site="B").num_rows == 0
+    assert store.variables() == [("salinity", "B"), ("temperature", "A")]
+
+
+def test_rolling_and_downsample(store):
+    store.append(_readings(2))
+    rolling = store.rolling("temperature", window="30 minutes").to_pylist()
+    assert [row["rolling_avg"] for row in rolling[:3]] == [0.0, 0.5, 1.0]
+
+    down = store.downsample("temperature", START, START + timedelta(hours=2), points=2)
+    assert down.num_rows == 2
+    assert down.column("avg").to_pylist() == [1.5, 5.5]
+
+
+def test_ingested_files_are_seen_without_a_refresh(store, tmp_path):
+    store.append(_readings(1, site="A"))
+    assert store.range("temperature").num_rows == 4
+
+    write_batch(
+        normalise(_readings(1, site="C"), "environment"), "environment", tmp_path
+    )
+    assert store.range("temperature", site="C").num_rows == 4
+    later = START + timedelta(days=40)
+    write_batch(
+        normalise(_readings(1, site="C", start=later), "environment"),
+        "environment",
+        tmp_path,
+    )
+    assert store.range("temperature", site="C").num_rows == 8
+
+
+def test_unknown_aggregates_and_intervals_are_rejected(store):
+    with pytest.raises(ValueError):
+        store.windowed("temperature", aggregates=("median",))
+    with pytest.raises(ValueError):
+        store.windowed("temperature", every="1 hour'; DROP TABLE local_readings; --")
@@ -0,0 +1,172 @@
+import json
+
+import pytest
+
+from cracks.localdb import LocalClient
+from cracks.writebehind import WriteBehindQueue
+
+
+class Flaky:
+    """A client whose procedure calls fail `failures` times first."""
+
+    def __init__(self, client, failures):
+        self.client = client
+        self.failures = failures
+        self.calls = 0
+
+    def rpc(self, function, params=None):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unreachable")
+        return self.client.rpc(function, params)
+
+    def table(self, name):
+        return self.client.table(name)
+
+
+def _stored(client, signature="sig"):
+    rows = (
+        client.table("cryosphere")
+        .select("nucleation_01")
+        .eq("signature", signature)
+        .execute()
+        .data
+    )
+    return json.loads(rows[0]["nucleation_01"]) if rows else None
+
+
+@pytest.fixture
+def queue_for(tmp_path):
+    queues = []
+
+    def make(conn, **kwargs):
+        # No background flush during a test: flushes are explicit.
+        kwargs.setdefault("dead_letters", tmp_path / "dead.jsonl")
+        queue = WriteBehindQueue(conn, flush_interval=60, **kwargs)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.close()
+
+
+def test_writes_to_one_signature_are_coalesced(queue_for):
+    client = LocalClient()
+    queue = queue_for(client)
+    tickets = [
+        queue.submit("cryosphere", "nucleation_01", "sig", {"a": 1}),
+        queue.submit("cryosphere", "nucleation_01", "sig", {"b": 2}),
+        queue.submit("cryosphere", "nucleation_01", "sig", {"a": 3}),
+    ]
+    assert queue.stats()["coalesced"] == 2 and queue.stats()["pending"] == 1
+
+    queue.flush()
+
+    assert _stored(client) == {"a": 3, "b": 2}
+    assert all(ticket.done() and ticket.existed is False for ticket in tickets)
+    assert queue.stats()["batches"] == 1 and queue.stats()["written"] == 1
+
+    ticket = queue.submit("cryosphere", "nucleation_01", "sig", {"c": 4})
+    queue.flush()
+    assert ticket.existed is True
+    assert _stored(client) == {"a": 3, "b": 2, "c": 4}
+
+
+def test_replace_drops_what_was_pending(queue_for):
+    client = LocalClient()
+    queue = queue_for(client)
+    queue.submit("cryosphere", "nucleation_01", "sig", {"a": 1})
+    queue.submit("cryosphere", "nucleation_01", "sig", {"b": 2}, merge=False)
+    queue.flush()
+    assert _stored(client) == {"b": 2}
+
+
+def test_delayed_writes_wait_unless_flushed(queue_for):
+    client = LocalClient()
+    queue = queue_for(client)
+    queue.submit("cryosphere", "nucleation_01", "sig", {"a": 1}, delay=60)
+    queue.flush(due_only=True)
+    assert _stored(client) is None
+    # A write without delay makes the coalesced one due at once.
+    queue.submit("cryosphere", "nucleation_01", "sig", {"b": 2})
+    queue.flush(due_only=True)
+    assert _stored(client) == {"a": 1, "b": 2}
+
+
+def test_failed_request_is_retried(queue_for):
+    conn = Flaky(LocalClient(), failures=1)
+    queue = queue_for(conn, max_attempts=2)
+    ticket = queue.submit("cryosphere", "nucleation_01", "sig", {"a": 1})
+    queue.flush()
+    assert conn.calls == 2
+    assert ticket.done() and ticket.error is None
+    assert queue.stats()["retries"] == 1
+    assert _stored(conn.client) == {"a": 1}
+
+
+def test_failed_flush_requeues_under_newer_writes(queue_for):
+    conn = Flaky(LocalClient(), failures=1)
+    queue = queue_for(conn, max_attempts=1)
+    first = queue.submit("cryosphere", "nucleation_01", "sig", {"a": 1, "b": 1})
+    queue.flush()
+    assert not first.done() and isinstance(first.last_error, ConnectionError)
+    assert queue.stats()["pending"] == 1
+
+    second = queue.submit("cryosphere", "nucleation_01", "sig", {"b": 2})
+    queue.flush()
+    assert first.done() and second.done()
+    assert _stored(conn.client) == {"a": 1, "b": 2}
+
+
+def test_write_is_dead_lettered_after_max_flushes(queue_for, tmp_path):
+    conn = Flaky(LocalClient(), failures=10**6)
+    queue = queue_for(conn, max_attempts=1, max_flushes=2)
+    ticket = queue.submit("cryosphere", "nucleation_01", "sig", {"a": 1})
+    queue.flush()
+    assert not ticket.done()
+    queue.flush()
+
+    assert ticket.done() and isinstance(ticket.error, ConnectionError)
+    assert queue.stats()["dropped"] == 1 and queue.stats()["pending"] == 0
+    (line,) = (tmp_path / "dead.jsonl").read_text().splitlines()
+    record = json.loads(line)
+    assert record["signature"] == "sig" and record["document"] == {"a": 1}
+    assert record["attempts"] == 2 and "database unreachable" in record["error"]
+
+
+STATUS_SCRIPT = """
+import streamlit as st
+from cracks import writebehind
+
+queue = st.session_state["queue"]
+if st.button("Submit"):
+    ticket = queue.submit("cryosphere", "nucleation_01", "sig", {"a": 1})
+    writebehind.remember_ticket(ticket)
+    st.success("Received!")
+writebehind.submission_status("ice")
+"""
+
+
+def test_submission_is_acknowledged_before_it_is_stored(queue_for):
+    from streamlit.testing.v1 import AppTest
+
+    client = LocalClient()
+    queue = queue_for(client)
+    app = AppTest.from_string(STATUS_SCRIPT)
+    app.session_state["queue"] = queue
+    app.run()
+    app.button[0].click().run()
+    # Acknowledged at once, without waiting for the flush.
+    assert [s.value for s in app.success] == ["Received!"]
+    assert "queued" in app.info[0].value
+    assert queue.stats()["pending"] == 1
+
+    queue.flush()
+    app.run()
+    assert "integrated successfully" in app.success[0].value
+    assert app.info[0].value == "Some of your preferences exist...Not yet"
+    # Shown once.
+    app.run()
+    assert not app.success and not app.info